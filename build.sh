@@ -5,5 +5,6 @@ set -o errexit
 pip install -r requirements.txt
 
 python manage.py collectstatic --no-input
+python manage.py build_images
 python manage.py migrate
 python setup_roles.py
@@ -0,0 +1,242 @@
+"""Room affinity across Daphne workers.
+
+A room's live state (its RoomState, round timer and seat timers) is held by
+one worker only: the one holding the room's lease in Redis. A socket that
+reaches any other worker is relayed to the owner over the channel layer and
+the game consumer runs there for it, exactly as if the socket had connected
+to the owner; the worker holding the socket only forwards frames both ways.
+
+The owner renews its leases while it holds the room in memory and gives them
+up when the room is dropped. If a worker dies its leases run out after
+GAME_ROOM_LEASE_SECONDS, and the next socket to connect claims the room and
+reloads it from the DB. Without GAME_ROOM_ROUTING (no REDIS_URL) there is one
+worker and it serves every room itself.
+"""
+import asyncio
+import logging
+import time
+from channels.layers import get_channel_layer
+from django.conf import settings
+from . import protocol
+
+logger = logging.getLogger(__name__)
+
+# Either end of a relay gives up once nothing, not even a keepalive, arrived for this long
+RELAY_IDLE_SECONDS = 60
+RELAY_KEEPALIVE_SECONDS = 20
+# How long a relayed socket waits for the owner to take it
+RELAY_OPEN_SECONDS = 10
+
+# Renew / release a lease only while this worker still holds it
+RENEW = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('expire', KEYS[1], ARGV[2]) end return 0"
+RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+
+def lease_key(room_code):
+    return f'game:room-owner:{room_code}'
+
+
+class RoomRouter:
+    """Claims rooms for this worker and hosts sockets relayed from the others"""
+
+    def __init__(self):
+        self.redis = None
+        # This worker's channel; the value of its leases and where relays are opened
+        self.channel = None
+        self.owned = {}     # room_code -> when this worker claimed it
+        self.relays = 0     # sockets on this worker relayed to another
+        self.task = None
+        self.ready = None
+
+    async def owner(self, room_code):
+        """None if this worker serves the room (claiming it when free), else the owner's channel"""
+        from .state import room_states
+
+        if not settings.GAME_ROOM_ROUTING or room_code in room_states.rooms or room_code in room_states.loading:
+            return None
+        await self._ensure_running()
+        key = lease_key(room_code)
+        while True:
+            if await self.redis.set(key, self.channel, nx=True, ex=settings.GAME_ROOM_LEASE_SECONDS):
+                self.owned[room_code] = time.monotonic()
+                return None
+            holder = await self.redis.get(key)
+            if holder is None:
+                continue  # ran out between the two calls
+            if holder.decode() == self.channel:
+                self.owned.setdefault(room_code, time.monotonic())
+                return None
+            return holder.decode()
+
+    async def release(self, room_code):
+        """Give up the room's lease once it is no longer held in memory here"""
+        if self.owned.pop(room_code, None) is not None and self.redis:
+            await self.redis.eval(RELEASE, 1, lease_key(room_code), self.channel)
+
+    async def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if not (self.task and not self.task.done() and self.task.get_loop() is loop):
+            self.ready = asyncio.Event()
+            self.task = loop.create_task(self._run())
+        await self.ready.wait()
+
+    async def _run(self):
+        import redis.asyncio
+
+        layer = get_channel_layer()
+        self.redis = redis.asyncio.from_url(settings.REDIS_URL, max_connections=settings.REDIS_MAX_CONNECTIONS)
+        self.channel = await layer.new_channel()
+        # Leases taken under an earlier event loop's channel are left to run out
+        self.owned = {}
+        self.ready.set()
+        renewer = asyncio.ensure_future(self._renew())
+        try:
+            while True:
+                message = await layer.receive(self.channel)
+                if message.get('type') == 'relay.open':
+                    asyncio.ensure_future(self.host(message))
+        finally:
+            renewer.cancel()
+
+    async def _renew(self):
+        from .state import room_states
+
+        lease = settings.GAME_ROOM_LEASE_SECONDS
+        while True:
+            await asyncio.sleep(lease / 3)
+            for room_code, claimed in list(self.owned.items()):
+                try:
+                    if room_code not in room_states.rooms and room_code not in room_states.loading:
+                        # Claimed for a socket that never got as far as loading the room
+                        if time.monotonic() - claimed > lease:
+                            await self.release(room_code)
+                        continue
+                    if (not await self.redis.eval(RENEW, 1, lease_key(room_code), self.channel, lease)
+                            and not await self.redis.set(lease_key(room_code), self.channel, nx=True, ex=lease)):
+                        logger.warning("Lease of a room held here was lost", extra={'room': room_code})
+                except Exception:
+                    logger.exception("Renewing a room lease failed", extra={'room': room_code})
+
+    # --- Relays ---
+
+    async def relay(self, owner, scope, receive, send):
+        """Forward a socket that reached this worker to the worker that owns its room"""
+        layer = get_channel_layer()
+        reply = await layer.new_channel()
+        await receive()  # websocket.connect
+        await layer.send(owner, {'type': 'relay.open', 'reply': reply, 'scope': {
+            'path': scope['path'],
+            'query_string': scope.get('query_string', b''),
+            'headers': [list(header) for header in scope.get('headers', [])],
+            'subprotocols': scope.get('subprotocols', []),
+            'client': scope.get('client'),
+            'url_route': {'args': [], 'kwargs': scope['url_route']['kwargs']},
+        }})
+        # Accept now, with the subprotocol the game consumer picks, rather than after two
+        # hops over the channel layer: Daphne drops handshakes that take over 5s
+        await send({'type': 'websocket.accept',
+                    'subprotocol': protocol.COMPACT if protocol.COMPACT in scope.get('subprotocols', []) else None})
+        try:
+            accepted = await asyncio.wait_for(layer.receive(reply), RELAY_OPEN_SECONDS)
+        except asyncio.TimeoutError:
+            logger.warning("Room owner did not answer, closing the socket", extra={'room': scope['url_route']['kwargs']['room_code']})
+            accepted = {'type': 'relay.close', 'code': 1011}
+        if accepted['type'] != 'relay.accept':
+            await send({'type': 'websocket.close', 'code': accepted.get('code', 1000)})
+            return
+        inbox = accepted['channel']
+
+        async def downstream():
+            while True:
+                try:
+                    message = await asyncio.wait_for(layer.receive(reply), RELAY_IDLE_SECONDS)
+                except asyncio.TimeoutError:
+                    logger.warning("Room owner went quiet, closing the socket", extra={'room': scope['url_route']['kwargs']['room_code']})
+                    await send({'type': 'websocket.close', 'code': 1011})
+                    return
+                if message['type'] == 'relay.frame':
+                    await send({'type': 'websocket.send', **{k: message[k] for k in ('text', 'bytes') if message.get(k) is not None}})
+                elif message['type'] == 'relay.close':
+                    await send({'type': 'websocket.close', 'code': message.get('code', 1000)})
+
+        tasks = [asyncio.ensure_future(downstream()), asyncio.ensure_future(keepalive(layer, inbox))]
+        self.relays += 1
+        try:
+            while True:
+                message = await receive()
+                await layer.send(inbox, message)
+                if message['type'] == 'websocket.disconnect':
+                    return
+        finally:
+            self.relays -= 1
+            for task in tasks:
+                task.cancel()
+
+    async def host(self, message):
+        """Run the game consumer here for a socket another worker holds"""
+        from .consumers import GameConsumer
+        from .middleware import SessionOnlyMiddleware
+
+        layer = get_channel_layer()
+        scope = message['scope']
+        owner = await self.owner(scope['url_route']['kwargs']['room_code'])
+        if owner is not None:
+            # The room changed hands after the other worker looked it up
+            await layer.send(owner, message)
+            return
+
+        reply = message['reply']
+        inbox = await layer.new_channel()
+        connected = False
+
+        async def receive():
+            nonlocal connected
+            if not connected:
+                connected = True
+                return {'type': 'websocket.connect'}
+            while True:
+                try:
+                    event = await asyncio.wait_for(layer.receive(inbox), RELAY_IDLE_SECONDS)
+                except asyncio.TimeoutError:
+                    # The worker holding the socket is gone
+                    return {'type': 'websocket.disconnect', 'code': 1006}
+                if event['type'] != 'relay.keepalive':
+                    return event
+
+        async def send(event):
+            if event['type'] == 'websocket.accept':
+                await layer.send(reply, {'type': 'relay.accept', 'channel': inbox})
+            elif event['type'] == 'websocket.send':
+                await layer.send(reply, {'type': 'relay.frame', 'text': event.get('text'), 'bytes': event.get('bytes')})
+            elif event['type'] == 'websocket.close':
+                await layer.send(reply, {'type': 'relay.close', 'code': event.get('code', 1000)})
+
+        pinger = asyncio.ensure_future(keepalive(layer, reply))
+        try:
+            await SessionOnlyMiddleware(GameConsumer.as_asgi())(dict(scope, type='websocket'), receive, send)
+        except Exception:
+            logger.exception("Relayed socket failed", extra={'room': scope['url_route']['kwargs']['room_code']})
+        finally:
+            pinger.cancel()
+
+
+async def keepalive(layer, channel):
+    while True:
+        await asyncio.sleep(RELAY_KEEPALIVE_SECONDS)
+        await layer.send(channel, {'type': 'relay.keepalive'})
+
+
+room_router = RoomRouter()
+
+
+class RoomAffinityMiddleware:
+    """Serves a room socket here if this worker owns the room, else relays it to the owner"""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    async def __call__(self, scope, receive, send):
+        owner = await room_router.owner(scope['url_route']['kwargs']['room_code'])
+        if owner is None:
+            return await self.inner(scope, receive, send)
+        return await room_router.relay(owner, scope, receive, send)
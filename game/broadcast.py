@@ -0,0 +1,28 @@
+import json
+from .protocol import compact
+
+try:
+    import orjson
+except ImportError:
+    # Optional: noticeably faster encoding of the large round result frames
+    orjson = None
+
+
+def encode(payload):
+    if orjson is not None:
+        return orjson.dumps(payload).decode()
+    return json.dumps(payload)
+
+
+async def group_broadcast(channel_layer, group_name, payload):
+    """Encode a client frame once per wire format and hand the same text to every socket in the group.
+
+    The consumers' broadcast_frame handler sends the text for its socket's
+    format as-is, so a round result for 12 players is serialized twice
+    instead of once per socket.
+    """
+    await channel_layer.group_send(group_name, {
+        'type': 'broadcast_frame',
+        'text': encode(payload),
+        'compact': encode(compact(payload))
+    })
@@ -0,0 +1,87 @@
+import hashlib
+import string
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from .models import RoomCodeSequence
+
+ALPHABET = string.ascii_uppercase + string.digits
+CODE_LENGTH = 6
+HALF = len(ALPHABET) ** (CODE_LENGTH // 2)  # 36^3: each Feistel half is three characters
+CODE_SPACE = HALF * HALF                    # 36^6 codes
+ROUNDS = 4
+
+
+class RoomCodeAllocator:
+    """Hands out room codes that never collide with each other.
+
+    Each process reserves a block of sequence numbers from RoomCodeSequence in
+    one UPDATE and then issues codes from memory. A number is turned into a
+    code by a keyed Feistel permutation of the 36^6 code space, so consecutive
+    rooms get unrelated-looking codes and two numbers never share a code.
+    The space wraps after about 2 billion rooms; by then the sweeper has long
+    deleted the rooms that held the early codes.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.next = 0
+        self.end = 0
+        self.key = None
+
+    def allocate(self):
+        with self.lock:
+            if self.next >= self.end:
+                self.next, self.end, self.key = reserve_block(getattr(settings, 'ROOM_CODE_BLOCK_SIZE', 1000))
+            value = self.next
+            self.next += 1
+            key = self.key
+        return encode(permute(value % CODE_SPACE, key))
+
+
+room_codes = RoomCodeAllocator()
+
+
+def reserve_block(size):
+    """Claim `size` consecutive sequence numbers; returns (start, end, key)
+
+    Callers allocate inside their own transaction (views.create_room), and a
+    block must stay claimed even if that transaction rolls back, or another
+    process would be handed the same numbers. So the claim runs on a thread of
+    its own, which has its own connection and commits on its own.
+    """
+    with ThreadPoolExecutor(1) as executor:
+        return executor.submit(claim_block, size).result()
+
+
+def claim_block(size):
+    try:
+        with transaction.atomic():
+            RoomCodeSequence.objects.filter(id=1).update(next_value=F('next_value') + size)
+            end, key = RoomCodeSequence.objects.values_list('next_value', 'key').get(id=1)
+        return end - size, end, bytes.fromhex(key)
+    finally:
+        connection.close()
+
+
+def permute(value, key):
+    """Bijection on range(CODE_SPACE): a balanced Feistel network over two base-36^3 halves"""
+    left, right = divmod(value, HALF)
+    for i in range(ROUNDS):
+        left, right = right, (left + round_function(key, i, right)) % HALF
+    return left * HALF + right
+
+
+def round_function(key, i, half):
+    digest = hashlib.blake2b(i.to_bytes(1, 'big') + half.to_bytes(4, 'big'), key=key, digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % HALF
+
+
+def encode(value):
+    chars = []
+    for _ in range(CODE_LENGTH):
+        value, digit = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[digit])
+    return ''.join(reversed(chars))
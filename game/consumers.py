@@ -1,421 +1,435 @@
+import asyncio
 import json
+import logging
 import random
-import asyncio
+import time
+from collections import namedtuple
+from functools import partial
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
-from django.utils import timezone
-from datetime import timedelta
-from .models import Room, Player, GameRole, Round, RoundParticipation
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from .models import Room, GameRole, Round, RoundParticipation
+from .scheduler import round_scheduler
+from .state import room_states, load_player
+from .roles import role_catalogue
+from .broadcast import encode, group_broadcast
+from .db import db_writes, release_read_connection
+from .sweeper import room_sweeper
+from . import metrics, protocol
+
+logger = logging.getLogger(__name__)
+
+# Client actions get their own metric labels; anything else is counted as 'unknown'
+ACTIONS = {'clock_sync', 'get_settings', 'update_settings', 'next_round', 'join', 'start_game', 'arrest'}
+# Close code for a socket replaced by a newer one from the same session; room.js does not reconnect after it
+CLOSE_SUPERSEDED = 4001
+
+# Who is behind a socket, resolved from the server-side session once at connect
+Identity = namedtuple('Identity', ['name', 'is_host'])
 
 class GameConsumer(AsyncWebsocketConsumer):
+    identity = None
+
     async def connect(self):
+        async with metrics.track_action('connect'):
+            await self._connect()
+            await release_read_connection()
+
+    async def disconnect(self, close_code):
+        async with metrics.track_action('disconnect'):
+            await self._disconnect(close_code)
+
+    async def receive(self, text_data):
+        async with metrics.track_action('unknown') as usage:
+            await self._receive(text_data, usage)
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        metrics.FRAMES_SENT.inc()
+        await super().send(text_data=text_data, bytes_data=bytes_data, close=close)
+
+    async def _connect(self):
+        # Clients that offer the compact subprotocol get compact frames (see game/protocol.py)
+        self.compact = protocol.COMPACT in self.scope.get('subprotocols', [])
+        # Role descriptions this socket has already been sent (compact only)
+        self.descriptions = {}
         # Accept immediately to establish connection
-        await self.accept()
+        await self.accept(protocol.COMPACT if self.compact else None)
         try:
             self.room_code = self.scope['url_route']['kwargs']['room_code']
             self.room_group_name = f'room_{self.room_code}'
-            self.timer_task = None
+            self.session_id = await self.get_session_id()
+            
+            if self.session_id:
+                # One socket per session: close any older one (a second tab, or a
+                # socket the client gave up on) on whichever worker holds it
+                self.session_group = session_group(self.room_code, self.session_id)
+                await self.channel_layer.group_send(self.session_group, {
+                    'type': 'superseded',
+                    'channel_name': self.channel_name
+                })
+                await self.channel_layer.group_add(self.session_group, self.channel_name)
+            
+            self.state = await room_states.get(self.room_code)
+            self.state.connections += 1
+            room_sweeper.ensure_running()
             
-            print(f"🔌 Connecting to room: {self.room_code}")
+            # Pick up players who joined (or renamed) through the HTTP view
+            player = None
+            if self.session_id:
+                player = await load_player(self.state.id, self.session_id)
+            # Messages act as this player; any session_id they carry is ignored
+            self.identity = Identity(player.name, player.is_host) if player else None
             
             await self.channel_layer.group_add(
                 self.room_group_name,
                 self.channel_name
             )
             
-            print(f"✅ Connected to {self.room_group_name}")
+            # Full roster to this socket unless it is reconnecting with the latest
+            # version, then a delta to everyone
+            async with self.state.lock:
+                up_to_date = self.roster_since() == (self.state.epoch, self.state.roster_version)
+                op = self.state.player_connected(player) if player else None
+                snapshot = self.state.roster_snapshot()
+            if not up_to_date:
+                await self.player_snapshot(snapshot)
+            if op:
+                await self.broadcast_player_delta(op, self.state.players[player.session_id].to_dict(), snapshot['version'])
             
-            # Send current player list to all connected clients
-            players = await self.get_players_in_room()
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'player_update',
-                    'players': players
-                }
-            )
+            self.restart_round_timer()
+            
+            # Replay what a (re)joining player missed: round, role, deadline, scores
+            if self.state.rounds_played or self.state.status != 'WAITING':
+                deadline = round_scheduler.deadline_for_group(self.room_group_name)
+                await self.send_frame(self.state.resume_frame(self.session_id, deadline))
+            
+            logger.info("Connected", extra={'room': self.room_code, 'player': player.name if player else None})
             
         except Exception as e:
-            print(f"❌ Error in connect: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Connect failed", extra={'room': getattr(self, 'room_code', None)})
             # Send error to client
             try:
-                await self.send(text_data=json.dumps({
+                await self.send_frame({
                     'action': 'error',
                     'message': f'Connection failed: {str(e)}'
-                }))
+                })
             except:
                 pass
             await self.close()
 
-    async def disconnect(self, close_code):
+    async def _disconnect(self, close_code):
         try:
+            if hasattr(self, 'session_group'):
+                await self.channel_layer.group_discard(self.session_group, self.channel_name)
+            
             if hasattr(self, 'room_group_name'):
-                print(f"🔌 Disconnecting from {self.room_group_name} (Code: {close_code})")
+                logger.info("Disconnected", extra={'room': self.room_code, 'code': close_code})
                 
-                # Handle Player Disconnect Logic
-                if 'session' in self.scope and self.scope['session'].session_key:
-                    await self.handle_player_disconnect(self.scope['session'].session_key)
+                # Hold the seat for a while instead of removing the player outright
+                if self.identity:
+                    await self.handle_player_disconnect(self.session_id)
                 
-                if self.timer_task:
-                    self.timer_task.cancel()
-                    
                 await self.channel_layer.group_discard(
                     self.room_group_name,
                     self.channel_name
                 )
+                
+                if hasattr(self, 'state'):
+                    await room_states.release(self.state)
             else:
-                print(f"🔌 Disconnecting (Code: {close_code}) - No room group")
-        except Exception as e:
-            print(f"❌ Error in disconnect: {e}")
-            print(f"❌ Error in disconnect: {str(e)}")
-            import traceback
-            traceback.print_exc()
+                logger.info("Disconnected before joining a room", extra={'code': close_code})
+        except Exception:
+            logger.exception("Disconnect failed", extra={'room': getattr(self, 'room_code', None)})
 
-    async def receive(self, text_data):
+    async def _receive(self, text_data, usage):
         try:
             data = json.loads(text_data)
             action = data.get('action')
-            session_id = data.get('session_id')
+            if action in ACTIONS:
+                usage.action = action
             
-            print(f"📩 Received action: {action} from {session_id}")
+            logger.debug("Received %s", action, extra={'room': self.room_code, 'player': self.identity and self.identity.name})
+
+            if action == 'clock_sync':
+                # Clock-offset handshake: echo the client's clock with ours
+                await self.send_frame({
+                    'action': 'clock_sync',
+                    'client_time': data.get('client_time'),
+                    'server_time': int(time.time() * 1000)
+                })
 
-            if action == 'get_settings':
+            elif action == 'get_settings':
                 settings = await self.get_game_settings_data()
-                await self.send(text_data=json.dumps({
+                await release_read_connection()
+                await self.send_frame({
                     'action': 'settings_data',
                     'settings': settings
-                }))
+                })
 
             elif action == 'update_settings':
-                max_rounds = int(data.get('max_rounds', 5))
-                timer_duration = int(data.get('timer_duration', 60))
-                roles_data = data.get('roles', [])
-                
-                await self.update_game_settings_advanced(max_rounds, timer_duration, roles_data)
-                
-                # Confirm save
-                await self.send(text_data=json.dumps({
-                    'action': 'settings_saved',
-                    'message': 'Settings updated successfully!'
-                }))
+                if self.from_host(action):
+                    await self.state.command(None, self.update_settings, data)
 
             elif action == 'next_round':
-                print(f"🔄 Next Round requested by {session_id}")
-                
-                can_start = await self.check_max_rounds()
-                if not can_start:
-                    print("🏁 Max rounds reached. Ending game.")
-                    final_scores = await self.get_final_scores()
-                    await self.channel_layer.group_send(
-                        self.room_group_name,
-                        {
-                            'type': 'game_over',
-                            'scores': final_scores
-                        }
-                    )
-                else:
-                    # Broadcast reset to all players
-                    await self.channel_layer.group_send(
-                        self.room_group_name,
-                        {
-                            'type': 'reset_round'
-                        }
-                    )
-                    
-                    # Start the next round
-                    player_count = await self.get_player_count()
-                    print(f"🚀 Starting next round with {player_count} players...")
-                    
-                    try:
-                        game_data = await self.start_new_round(player_count)
-                        print(f"✅ Next round started. Round ID: {game_data.get('round_id')}")
-                        
-                        # Start Timer Task
-                        if self.timer_task:
-                            self.timer_task.cancel()
-                        self.timer_task = asyncio.create_task(self.run_timer(game_data['round_id']))
-                        
-                        # Send roles
-                        for player_data in game_data['players']:
-                            message = {
-                                'type': 'send_role_to_player',
-                                'target_session_id': player_data['session_id'],
-                                'role': player_data['role'],
-                                'description': player_data['description'],
-                                'points': player_data['points'],
-                                'is_police': player_data['is_police'],
-                                'is_thief': player_data['is_thief'],
-                                'all_players': game_data['all_players'] if player_data['is_police'] else None
-                            }
-                            
-                            await self.channel_layer.group_send(
-                                self.room_group_name,
-                                message
-                            )
-                    except Exception as e:
-                        print(f"❌ Error starting next round: {e}")
-                        import traceback
-                        traceback.print_exc()
-                        await self.send(text_data=json.dumps({
-                            'action': 'error',
-                            'message': f'Failed to start next round: {str(e)}'
-                        }))
+                # Every player's results screen can ask; only the first request per round counts
+                await self.state.command('start_round', self.start_round, action, data.get('after_round'))
 
             elif action == 'join':
-                players = await self.get_players_in_room()
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        'type': 'player_update',
-                        'players': players
-                    }
-                )
+                # Client asks for a resync (e.g. it missed a roster version)
+                await self.player_snapshot(self.state.roster_snapshot())
         
             elif action == 'start_game':
-                # Remove any existing bots first - REMOVED for performance
-                # await self.remove_bots()
-                
-                # Broadcast updated player list (without bots)
-                players = await self.get_players_in_room()
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        'type': 'player_update',
-                        'players': players
-                    }
-                )
-                
-                player_count = await self.get_player_count()
-                
-                if player_count < 2:
-                    await self.send(text_data=json.dumps({
-                        'action': 'error',
-                        'message': f'Need at least 2 players to start. Currently have {player_count}.'
-                    }))
-                    return
-                
-                if player_count > 12:
-                     await self.send(text_data=json.dumps({
-                        'action': 'error',
-                        'message': f'Maximum 12 players allowed. Currently have {player_count}.'
-                    }))
-                     return
-
-                # Check max rounds
-                print(f"🔄 Checking max rounds for Room {self.room_code}...")
-                can_start = await self.check_max_rounds()
-                print(f"🔄 Check Max Rounds Result: {can_start}")
-                
-                if not can_start:
-                    print("🏁 Max rounds reached (in start_game). Ending game.")
-                    # GAME OVER LOGIC
-                    final_scores = await self.get_final_scores()
-                    await self.channel_layer.group_send(
-                        self.room_group_name,
-                        {
-                            'type': 'game_over',
-                            'scores': final_scores
-                        }
-                    )
-                    return
-
-                print(f"🚀 Starting new round for Room {self.room_code} with {player_count} players...")
-                try:
-                    game_data = await self.start_new_round(player_count)
-                    print(f"✅ Round started successfully. Round ID: {game_data.get('round_id')}")
-                except Exception as e:
-                    print(f"❌ Error in start_new_round: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    await self.send(text_data=json.dumps({
-                        'action': 'error',
-                        'message': f'Failed to start round: {str(e)}'
-                    }))
-                    return
-                
-                # Start Timer Task
-                if self.timer_task:
-                    self.timer_task.cancel()
-                self.timer_task = asyncio.create_task(self.run_timer(game_data['round_id']))
-                
-                # Send roles
-                for player_data in game_data['players']:
-                    message = {
-                        'type': 'send_role_to_player',
-                        'target_session_id': player_data['session_id'],
-                        'role': player_data['role'],
-                        'description': player_data['description'],
-                        'points': player_data['points'], # Win points shown initially
-                        'is_police': player_data['is_police'],
-                        'is_thief': player_data['is_thief'],
-                        'all_players': game_data['all_players'] if player_data['is_police'] else None
-                    }
-                    
-                    await self.channel_layer.group_send(
-                        self.room_group_name,
-                        message
-                    )
+                if self.from_host(action):
+                    await self.state.command('start_round', self.start_round, action, None)
+
             elif action == 'arrest':
-                arrested_player_name = data.get('arrested_player')
-                print(f"🚨 Arrest Request: {session_id} wants to arrest {arrested_player_name}")
-                
-                is_valid_police = await self.verify_police(session_id)
-                if not is_valid_police:
-                    print(f"❌ Invalid Police: {session_id}")
-                    return
-                
-                print(f"✅ Valid Police. Processing arrest...")
-                result = await self.process_arrest(arrested_player_name)
+                await self.state.command(None, self.arrest, data.get('arrested_player'))
                 
-                if self.timer_task:
-                    self.timer_task.cancel()
-                
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        'type': 'round_result',
-                        'winner': result['winner'],
-                        'thief_name': result['thief_name'],
-                        'scores': result['scores'],
-                        'all_roles': result['all_roles']
-                    }
-                )
-                
-        except Exception as e:
-            print(f"❌ Error in receive: {str(e)}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Handling a message failed", extra={'room': self.room_code})
+
+    def from_host(self, action):
+        """Only the host may change the settings or start the game"""
+        if self.identity and self.identity.is_host:
+            return True
+        logger.warning("%s from a non-host player ignored", action, extra={'room': self.room_code, 'player': self.identity and self.identity.name})
+        return False
+
+    # --- Room commands (run one at a time per room through RoomState.command) ---
+
+    async def update_settings(self, data):
+        max_rounds = int(data.get('max_rounds', 5))
+        timer_duration = int(data.get('timer_duration', 60))
+        roles_data = data.get('roles', [])
+        
+        await self.update_game_settings_advanced(max_rounds, timer_duration, roles_data)
+        async with self.state.lock:
+            self.state.update_settings(max_rounds, timer_duration)
+        
+        # Confirm save
+        await self.send_frame({
+            'action': 'settings_saved',
+            'message': 'Settings updated successfully!'
+        })
+
+    async def start_round(self, action, after_round):
+        """start_game / next_round: start the next round, or end the game after max_rounds"""
+        current_round = self.state.current_round
+        if current_round and current_round.status == 'PLAYING':
+            logger.debug("%s ignored, a round is already running", action, extra={'room': self.room_code})
+            return
+        if after_round is not None and (self.state.status == 'FINISHED' or (current_round and current_round.id != after_round)):
+            # Another player's request already moved the game on from that round
+            logger.debug("%s ignored, sent for an earlier round", action, extra={'room': self.room_code})
+            return
+
+        if action == 'start_game':
+            player_count = len(self.state.players)
+            
+            if player_count < 2:
+                await self.send_frame({
+                    'action': 'error',
+                    'message': f'Need at least 2 players to start. Currently have {player_count}.'
+                })
+                return
+            
+            if player_count > 12:
+                await self.send_frame({
+                    'action': 'error',
+                    'message': f'Maximum 12 players allowed. Currently have {player_count}.'
+                })
+                return
+
+        # Check max rounds
+        if not self.state.can_start_round():
+            logger.info("Max rounds reached, ending game", extra={'room': self.room_code})
+            async with self.state.lock:
+                final_scores = self.state.finish_game()
+            await self.broadcast({
+                'action': 'game_over',
+                'scores': final_scores
+            })
+            return
+
+        if action == 'next_round':
+            # Broadcast reset to all players
+            await self.broadcast({
+                'action': 'reset_round'
+            })
 
-    async def run_timer(self, round_id):
-        """Timer loop that runs based on room settings"""
-        print(f"⏰ Timer STARTED for Round {round_id}")
-        
-        # Get timer duration from room settings
-        timer_duration = await self.get_timer_duration()
-        print(f"⏰ Timer duration: {timer_duration} seconds")
-        
         try:
-            for i in range(timer_duration, -1, -1):
-                # Check if round is still playing
-                status = await self.get_round_status(round_id)
-                
-                if status == 'COMPLETED':
-                    print(f"⏰ Timer STOPPED: Round {round_id} completed early.")
-                    break
-                
-                # Broadcast timer tick
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        'type': 'timer_update',
-                        'seconds': i
-                    }
-                )
-                
-                if i == 0:
-                    print(f"⏰ Timer EXPIRED for Round {round_id}")
-                    # Timeout - Thief Wins
-                    result = await self.process_timeout(round_id)
-                    await self.channel_layer.group_send(
-                        self.room_group_name,
-                        {
-                            'type': 'round_result',
-                            'winner': result['winner'],
-                            'thief_name': result['thief_name'],
-                            'scores': result['scores'],
-                            'all_roles': result['all_roles']
-                        }
-                    )
-                    break
-                
-                await asyncio.sleep(1)
-        except asyncio.CancelledError:
-            print(f"⏰ Timer CANCELLED for Round {round_id}")
-            pass
+            game_data = await self.begin_round()
         except Exception as e:
-            print(f"❌ Timer CRASHED for Round {round_id}: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Starting round failed", extra={'room': self.room_code})
+            await self.send_frame({
+                'action': 'error',
+                'message': f'Failed to start round: {str(e)}'
+            })
+            return
+        
+        # Start Timer
+        await self.start_round_timer(game_data)
+        
+        # Send roles
+        await self.send_roles(game_data)
+
+    async def arrest(self, arrested_player_name):
+        current_round = self.state.current_round
+        if not current_round or current_round.status != 'PLAYING':
+            # A repeated arrest: the round is already over
+            logger.debug("Arrest ignored, no round running", extra={'room': self.room_code})
+            return
+        if not self.identity or not self.state.is_police(self.session_id):
+            logger.warning("Arrest from a non-police player ignored", extra={'room': self.room_code, 'player': self.identity and self.identity.name})
+            return
+        
+        async with self.state.lock:
+            result = self.state.resolve_arrest(arrested_player_name)
+        
+        if result.get('round_id'):
+            round_scheduler.cancel(result['round_id'])
+        
+        await self.broadcast(round_result_frame(result))
+        # The arrest was queued, so every socket may have closed while the round was still running
+        await room_states.discard_if_idle(self.state)
+
+    def restart_round_timer(self):
+        """Pick up the countdown of a round that was running when the room was last in memory"""
+        current_round = self.state.current_round
+        if not current_round or current_round.restored_deadline is None:
+            return
+        deadline, current_round.restored_deadline = current_round.restored_deadline, None
+        if current_round.status != 'PLAYING':
+            return
+        # A round whose time ran out while the server was down times out straight away
+        logger.info("Restarting the timer of a restored round", extra={'room': self.room_code, 'round': current_round.id})
+        round_scheduler.schedule(
+            current_round.id,
+            self.room_group_name,
+            max(0, deadline - time.time()),
+            partial(expire_round, self.room_code)
+        )
 
-    async def player_update(self, event):
-        await self.send(text_data=json.dumps({
-            'action': 'player_joined',
-            'players': event['players']
-        }))
+    async def start_round_timer(self, game_data):
+        deadline = round_scheduler.schedule(
+            game_data['round_id'],
+            self.room_group_name,
+            game_data['timer_duration'],
+            partial(expire_round, self.room_code)
+        )
+        
+        # One frame per player for the whole countdown; clients render it locally
+        await self.broadcast({
+            'action': 'round_started',
+            'round_id': game_data['round_id'],
+            'duration': game_data['timer_duration'],
+            'deadline': int(deadline * 1000),
+            'server_time': int(time.time() * 1000)
+        })
+
+    async def begin_round(self):
+        """Write the next round and switch the room to it.
+
+        Commands already run one at a time, so the lock is only held for the
+        in-memory switch; connects and roster changes go on during the insert.
+        """
+        # Let queued writes (e.g. last round's scores) land before writing the new round
+        await self.state.flush()
+        last_police_id, last_thief_id = self.state.last_round_roles()
+        game_data = await self.start_new_round(
+            list(self.state.players.values()),
+            self.state.rounds_played + 1,
+            last_police_id,
+            last_thief_id
+        )
+        async with self.state.lock:
+            self.state.begin_round(game_data)
+        return game_data
+
+    async def send_roles(self, game_data):
+        """Deliver each role only to its owner's socket (one frame per player)"""
+        frames_sent = 0
+        for player_data in game_data['players']:
+            # The session's group holds its one socket, wherever the channel layer delivers to
+            await self.channel_layer.group_send(session_group(self.room_code, player_data['session_id']), {
+                'type': 'send_role_to_player',
+                'target_session_id': player_data['session_id'],
+                'role': player_data['role'],
+                'description': player_data['description'],
+                'points': player_data['points'], # Win points shown initially
+                'is_police': player_data['is_police'],
+                'is_thief': player_data['is_thief'],
+                'all_players': game_data['all_players'] if player_data['is_police'] else None
+            })
+            frames_sent += 1
+            metrics.ROLE_FRAMES.inc('police' if player_data['is_police'] else 'thief' if player_data['is_thief'] else 'civilian')
+        
+        logger.debug("Role frames sent", extra={'room': self.room_code, 'round': game_data['round_id'], 'frames': frames_sent, 'players': len(game_data['players'])})
+        return frames_sent
+
+    async def send_frame(self, payload):
+        await self.send(text_data=encode(protocol.compact(payload) if self.compact else payload))
+
+    def roster_since(self):
+        """(epoch, version) of the roster a reconnecting client already has, from ?since=<epoch>.<version>"""
+        since = parse_qs(self.scope.get('query_string', b'').decode()).get('since', [''])[0]
+        epoch, _, version = since.partition('.')
+        return (epoch, int(version)) if version.isdigit() else None
+
+    async def superseded(self, event):
+        if event['channel_name'] != self.channel_name:
+            logger.info("Closing a socket replaced by a newer one from the same session", extra={'room': self.room_code})
+            await self.close(code=CLOSE_SUPERSEDED)
+
+    async def player_snapshot(self, snapshot):
+        await self.send_frame({
+            'action': 'player_snapshot',
+            'players': snapshot['players'],
+            'version': snapshot['version'],
+            'epoch': snapshot['epoch']
+        })
+
+    async def broadcast_player_delta(self, op, player, version):
+        await self.broadcast({
+            'action': op,
+            'player': player,
+            'version': version
+        })
+
+    async def broadcast(self, payload):
+        await group_broadcast(self.channel_layer, self.room_group_name, payload)
+
+    async def broadcast_frame(self, event):
+        # Already encoded once per format for the whole group
+        await self.send(text_data=event['compact'] if self.compact else event['text'])
 
     async def send_role_to_player(self, event):
-        await self.send(text_data=json.dumps({
+        frame = {
             'action': 'send_role_to_player',
             'target_session_id': event['target_session_id'],
             'role': event['role'],
             'description': event['description'],
             'points': event['points'],
             'is_police': event['is_police'],
+            'is_thief': event['is_thief'],
             'all_players': event.get('all_players')
-        }))
-
-    async def round_result(self, event):
-        await self.send(text_data=json.dumps({
-            'action': 'round_ended',
-            'winner': event['winner'],
-            'thief_name': event['thief_name'],
-            'scores': event['scores'],
-            'all_roles': event.get('all_roles', [])
-        }))
-
-    async def game_over(self, event):
-        await self.send(text_data=json.dumps({
-            'action': 'game_over',
-            'scores': event['scores']
-        }))
-
-    async def timer_update(self, event):
-        await self.send(text_data=json.dumps({
-            'action': 'timer_tick',
-            'seconds': event['seconds']
-        }))
-
-    async def reset_round(self, event):
-        await self.send(text_data=json.dumps({
-            'action': 'reset_round'
-        }))
-
-    @database_sync_to_async
-    def get_round_status(self, round_id):
-        try:
-            round_obj = Round.objects.get(id=round_id)
-            return round_obj.status
-        except Round.DoesNotExist:
-            return 'COMPLETED'
-
-    @database_sync_to_async
-    def get_players_in_room(self):
-        room = Room.objects.get(room_code=self.room_code)
-        return [{'name': p.name, 'avatar': p.avatar, 'session_id': p.session_id} for p in room.players.all()]
-
-    @database_sync_to_async
-    def get_player_count(self):
-        room = Room.objects.get(room_code=self.room_code)
-        return room.players.count()
-    
-    @database_sync_to_async
-    def get_timer_duration(self):
-        room = Room.objects.get(room_code=self.room_code)
-        return room.timer_duration
-
-    @database_sync_to_async
-    def remove_bots(self):
-        room = Room.objects.get(room_code=self.room_code)
-        room.players.filter(name__startswith="Bot_").delete()
-
+        }
+        if self.compact:
+            # The client keeps descriptions by role name, so each is sent once per connection
+            if self.descriptions.get(event['role']) == event['description']:
+                del frame['description']
+            else:
+                self.descriptions[event['role']] = event['description']
+        await self.send_frame(frame)
 
+    async def get_session_id(self):
+        session = self.scope.get('session')
+        return await session.aget('session_id') if session is not None else None
 
-    @database_sync_to_async
-    def get_game_settings_data(self):
-        room = Room.objects.get(room_code=self.room_code)
-        roles = GameRole.objects.all().order_by('id')
+    async def get_game_settings_data(self):
+        roles = await role_catalogue.aall()
         
         roles_data = []
         for r in roles:
@@ -426,18 +440,17 @@ class GameConsumer(AsyncWebsocketConsumer):
             })
             
         return {
-            'max_rounds': room.max_rounds,
-            'timer_duration': room.timer_duration,
+            'max_rounds': self.state.max_rounds,
+            'timer_duration': self.state.timer_duration,
             'roles': roles_data
         }
 
-    @database_sync_to_async
-    def update_game_settings_advanced(self, max_rounds, timer_duration, roles_data):
-        # Update Room
-        room = Room.objects.get(room_code=self.room_code)
-        room.max_rounds = max_rounds
-        room.timer_duration = timer_duration
-        room.save()
+    async def update_game_settings_advanced(self, max_rounds, timer_duration, roles_data):
+        await db_writes.run(self.save_game_settings, max_rounds, timer_duration, roles_data)
+
+    def save_game_settings(self, max_rounds, timer_duration, roles_data):
+        # Update Room (only these columns: a write-behind status change may run alongside)
+        Room.objects.filter(id=self.state.id).update(max_rounds=max_rounds, timer_duration=timer_duration)
         
         # Update Roles
         for r_data in roles_data:
@@ -449,77 +462,28 @@ class GameConsumer(AsyncWebsocketConsumer):
             except GameRole.DoesNotExist:
                 pass
 
-    @database_sync_to_async
-    def check_max_rounds(self):
-        room = Room.objects.get(room_code=self.room_code)
-        current_rounds = room.rounds.count()
-        print(f"📊 Round Check: Current {current_rounds} / Max {room.max_rounds}")
-        return current_rounds < room.max_rounds
-
-    @database_sync_to_async
-    def get_final_scores(self):
-        room = Room.objects.get(room_code=self.room_code)
-        room.status = 'FINISHED'
-        room.save()
-        
-        # Get all players and their total scores
-        players = room.players.all().order_by('-total_score')
-        
-        scores = []
-        for player in players:
-            scores.append({
-                'name': player.name,
-                'score': player.total_score
-            })
-        
-        return scores
-    @database_sync_to_async
-    def verify_police(self, session_id):
-        room = Room.objects.get(room_code=self.room_code)
-        # Get the latest playing round
-        current_round = room.rounds.filter(status='PLAYING').order_by('-id').first()
-        
-        if not current_round:
-            print("❌ verify_police: No playing round found")
-            return False
-            
-        if not current_round.police_player:
-            print("❌ verify_police: No police player assigned")
-            return False
-            
-        is_match = current_round.police_player.session_id == session_id
-        print(f"👮 Verify Police Check:")
-        print(f"   - Round ID: {current_round.id}")
-        print(f"   - Round Status: {current_round.status}")
-        print(f"   - Expected Police Session: {current_round.police_player.session_id} ({current_round.police_player.name})")
-        print(f"   - Actual Requester Session: {session_id}")
-        print(f"   - Match: {is_match}")
-        return is_match
-
-    @database_sync_to_async
-    def start_new_round(self, player_count):
-        room = Room.objects.get(room_code=self.room_code)
+    async def start_new_round(self, players, round_number, last_police_id, last_thief_id):
+        return await db_writes.run(self.create_round, players, round_number, last_police_id, last_thief_id)
+
+    def create_round(self, players, round_number, last_police_id, last_thief_id):
+        player_count = len(players)
         
         # CRITICAL FIX: Close any existing playing rounds to prevent "zombie rounds"
-        active_rounds = room.rounds.filter(status='PLAYING')
-        if active_rounds.exists():
-            print(f"⚠️ Found {active_rounds.count()} active rounds. Closing them...")
-            for r in active_rounds:
-                r.status = 'ABANDONED'
-                r.save()
+        abandoned = Round.objects.filter(room_id=self.state.id, status='PLAYING').update(status='ABANDONED')
+        if abandoned:
+            logger.warning("Closed %d active rounds", abandoned, extra={'room': self.room_code})
         
-        room.status = 'IN_PROGRESS'
-        room.save()
+        if self.state.status != 'IN_PROGRESS':
+            Room.objects.filter(id=self.state.id).update(status='IN_PROGRESS')
         
-        players = list(room.players.all())
-        all_roles_qs = list(GameRole.objects.all())
+        all_roles_qs = role_catalogue.all()
         
         # Robust Role Check & Creation
         has_police_role = any(r.is_police for r in all_roles_qs)
         has_thief_role = any(r.is_thief for r in all_roles_qs)
         
         if not has_police_role or not has_thief_role:
-            print("⚠️ Critical Roles Missing! Creating defaults...")
+            logger.warning("Police/Thief roles missing, creating defaults")
             if not has_police_role:
                 GameRole.objects.create(name="Police", is_police=True, win_points=100)
             if not has_thief_role:
@@ -530,10 +494,8 @@ class GameConsumer(AsyncWebsocketConsumer):
                  GameRole.objects.create(name="Civilian", win_points=50)
                  
             # Refresh list
-            all_roles_qs = list(GameRole.objects.all())
-            print("✅ Roles repaired.")
-        
-        # Select roles: Must have Police and Thief
+            all_roles_qs = role_catalogue.all()
+            logger.info("Roles repaired")
         
         # Select roles: Must have Police and Thief
         police_role = next(r for r in all_roles_qs if r.is_police)
@@ -542,7 +504,7 @@ class GameConsumer(AsyncWebsocketConsumer):
         
         # CRITICAL FIX: Ensure other_roles is not empty (need at least one Civilian)
         if not other_roles:
-            print("⚠️ No Civilian role found! Creating one...")
+            logger.warning("No civilian role found, creating one")
             civilian = GameRole.objects.create(name="Civilian", win_points=50)
             other_roles = [civilian]
         
@@ -554,23 +516,10 @@ class GameConsumer(AsyncWebsocketConsumer):
              other_roles.append(other_roles[0]) # Duplicate first role if needed
              
         selected_roles = [police_role, thief_role] + other_roles[:player_count-2]
-        
-        # Verify we have Police and Thief
-        has_police = any(r.is_police for r in selected_roles)
-        has_thief = any(r.is_thief for r in selected_roles)
-        print(f"🎲 Starting Round with {player_count} players. Roles: {[r.name for r in selected_roles]}")
-        print(f"👮 Has Police: {has_police}, 🦹 Has Thief: {has_thief}")
-        
-        if not has_police or not has_thief:
-            print("❌ CRITICAL ERROR: Missing Police or Thief in selected roles!")
-            raise Exception("Failed to assign required roles (Police/Thief)")
+        logger.info("Starting round", extra={'room': self.room_code, 'round': round_number, 'players': player_count})
         
         # --- SMART SHUFFLE LOGIC ---
-        # Get last round's roles to avoid immediate repeats
-        last_round = room.rounds.filter(status__in=['COMPLETED', 'ABANDONED']).order_by('-id').first()
-        last_police_id = last_round.police_player.id if last_round and last_round.police_player else None
-        last_thief_id = last_round.thief_player.id if last_round and last_round.thief_player else None
-        
+        # Avoid giving last round's Police/Thief the same role again
         max_retries = 5
         for attempt in range(max_retries):
             random.shuffle(players)
@@ -580,62 +529,56 @@ class GameConsumer(AsyncWebsocketConsumer):
             if not last_police_id and not last_thief_id:
                 break
             if attempt == max_retries - 1:
-                print("⚠️ Smart Shuffle: Max retries reached, accepting shuffle.")
+                logger.debug("Smart shuffle: max retries reached, accepting shuffle", extra={'room': self.room_code})
                 break
                 
-            # Check assignments
-            # Find who got Police and Thief in this proposed shuffle
             # players[i] gets selected_roles[i]
-            
-            proposed_police = None
-            proposed_thief = None
-            
-            for i in range(len(players)):
-                if selected_roles[i].is_police:
-                    proposed_police = players[i]
-                elif selected_roles[i].is_thief:
-                    proposed_thief = players[i]
+            proposed_police = next(players[i] for i, r in enumerate(selected_roles) if r.is_police)
+            proposed_thief = next(players[i] for i, r in enumerate(selected_roles) if r.is_thief)
             
             # Check for repeats
-            repeat_police = (proposed_police and proposed_police.id == last_police_id)
-            repeat_thief = (proposed_thief and proposed_thief.id == last_thief_id)
+            repeat_police = proposed_police.id == last_police_id
+            repeat_thief = proposed_thief.id == last_thief_id
             
             if repeat_police or repeat_thief:
-                print(f"🔄 Smart Shuffle: Retry {attempt+1}/{max_retries} (Police Repeat: {repeat_police}, Thief Repeat: {repeat_thief})")
+                logger.debug("Smart shuffle retry %d/%d (police repeat: %s, thief repeat: %s)",
+                             attempt + 1, max_retries, repeat_police, repeat_thief, extra={'room': self.room_code})
                 continue
             else:
-                print("✅ Smart Shuffle: Good distribution found.")
+                logger.debug("Smart shuffle: good distribution found", extra={'room': self.room_code})
                 break
         # ---------------------------
         
-        round_obj = Round.objects.create(
-            room=room,
-            round_number=room.rounds.count() + 1,
-            status='PLAYING'
-        )
+        police_player = next(players[i] for i, r in enumerate(selected_roles) if r.is_police)
+        thief_player = next(players[i] for i, r in enumerate(selected_roles) if r.is_thief)
+        
+        with transaction.atomic():
+            round_obj = Round.objects.create(
+                room_id=self.state.id,
+                round_number=round_number,
+                status='PLAYING',
+                police_player_id=police_player.id,
+                thief_player_id=thief_player.id
+            )
+            
+            RoundParticipation.objects.bulk_create([
+                RoundParticipation(
+                    round=round_obj,
+                    player_id=player.id,
+                    role_name=role.name,
+                    role_description=role.description,
+                    win_points=role.win_points,
+                    lose_points=role.lose_points
+                )
+                for player, role in zip(players, selected_roles)
+            ])
         
         player_data = []
         all_players_info = []
         
-        for i in range(player_count):
-            player = players[i]
-            role = selected_roles[i]
-            
-            RoundParticipation.objects.create(
-                round=round_obj,
-                player=player,
-                role_name=role.name,
-                role_description=role.description,
-                win_points=role.win_points,
-                lose_points=role.lose_points
-            )
-            
-            if role.is_police:
-                round_obj.police_player = player
-            elif role.is_thief:
-                round_obj.thief_player = player
-            
+        for player, role in zip(players, selected_roles):
             player_data.append({
+                'player_id': player.id,
                 'session_id': player.session_id,
                 'name': player.name,
                 'role': role.name,
@@ -646,161 +589,91 @@ class GameConsumer(AsyncWebsocketConsumer):
             })
             
             all_players_info.append({
+                'player_id': player.id,
                 'name': player.name,
                 'avatar': player.avatar,
                 'session_id': player.session_id
             })
         
-        round_obj.save()
-        
         return {
             'round_id': round_obj.id,
+            'round_number': round_obj.round_number,
+            'timer_duration': self.state.timer_duration,
             'players': player_data,
             'all_players': all_players_info
         }
 
-    @database_sync_to_async
-    def process_arrest(self, arrested_player_name):
-        room = Room.objects.get(room_code=self.room_code)
-        current_round = room.rounds.filter(status='PLAYING').first()
-        
-        if not current_round:
-            return {'winner': 'ERROR', 'thief_name': '', 'scores': [], 'all_roles': []}
-        
-        thief = current_round.thief_player
-        arrested_player = room.players.filter(name=arrested_player_name).first()
-        
-        # Determine Winner
-        if arrested_player == thief:
-            current_round.winner = 'POLICE'
-            # Police wins
-            for p in current_round.participations.all():
-                if p.role_name == 'Police':
-                    p.final_score = p.win_points
-                elif p.role_name == 'Thief':
-                    p.final_score = 0  # Loser gets 0
-                    p.is_caught = True
-                else:
-                    # Civilians always get points
-                    p.final_score = p.win_points
-                
-                p.save()
-                p.player.total_score += p.final_score
-                p.player.save()
-        else:
-            current_round.winner = 'THIEF'
-            # Thief wins
-            for p in current_round.participations.all():
-                if p.role_name == 'Police':
-                    p.final_score = 0  # Loser gets 0
-                elif p.role_name == 'Thief':
-                    p.final_score = p.win_points
-                else:
-                    # Civilians always get points
-                    p.final_score = p.win_points
-                
-                if p.player == arrested_player:
-                    p.is_wrongly_accused = True
-                
-                p.save()
-                p.player.total_score += p.final_score
-                p.player.save()
-        
-        current_round.status = 'COMPLETED'
-        current_round.save()
-        
-        return self._get_round_result_data(room, current_round)
-
-    @database_sync_to_async
-    def process_timeout(self, round_id):
-        round_obj = Round.objects.get(id=round_id)
-        round_obj.winner = 'THIEF'
-        round_obj.status = 'COMPLETED'
-        round_obj.save()
-        
-        thief = round_obj.thief_player
-        
-        # Thief wins by timeout
-        for p in round_obj.participations.all():
-            if p.role_name == 'Police':
-                p.final_score = 0  # Loser gets 0
-            elif p.role_name == 'Thief':
-                p.final_score = p.win_points
-            else:
-                # Civilians always get points
-                p.final_score = p.win_points
-            
-            p.save()
-            p.player.total_score += p.final_score
-            p.player.save()
-            
-        return self._get_round_result_data(room, round_obj)
-
-    def _get_round_result_data(self, room, round_obj):
-        all_roles_reveal = []
-        for participation in round_obj.participations.all():
-            all_roles_reveal.append({
-                'name': participation.player.name,
-                'role': participation.role_name
-            })
-            
-        # Get updated scores (sorted by score descending)
-        scores = []
-        for p in room.players.all().order_by('-total_score'):
-             scores.append({
-                 'name': p.name,
-                 'score': p.total_score,
-                 'avatar': p.avatar
-             })
-             
-        thief_name = round_obj.thief_player.name if round_obj.thief_player else "Unknown"
-        
-        return {
-            'winner': round_obj.winner,
-            'thief_name': thief_name,
-            'scores': scores,
-            'all_roles': all_roles_reveal
-        }
-
-    @database_sync_to_async
-    def remove_player_from_room(self, session_id):
-        try:
-            room = Room.objects.get(room_code=self.room_code)
-            player = room.players.filter(session_id=session_id).first()
-            if player:
-                print(f"👋 Removing player {player.name} from room")
-                player.delete()
-                return True
-            return False
-        except Exception as e:
-            print(f"Error removing player: {e}")
-            return False
-
     async def handle_player_disconnect(self, session_id):
-        await self.remove_player_from_room(session_id)
-        
-        # Broadcast update
-        players = await self.get_players_in_room()
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'player_update',
-                'players': players
-            }
-        )
+        """Mark the player offline and free their seat only if they stay away for the grace period"""
+        state = self.state
+        async with state.lock:
+            player = state.player_disconnected(session_id)
+            version = state.roster_version
+            if player:
+                loop = asyncio.get_running_loop()
+                state.departures[session_id] = loop.call_later(
+                    settings.GAME_RECONNECT_GRACE,
+                    lambda: loop.create_task(remove_departed(state, session_id))
+                )
+        if player:
+            logger.info("Player offline, holding seat for %ss", settings.GAME_RECONNECT_GRACE, extra={'room': self.room_code, 'player': player.name})
+            await self.broadcast_player_delta('player_changed', player.to_dict(), version)
 
     async def host_change(self, event):
-        await self.send(text_data=json.dumps({
+        if self.identity:
+            self.identity = self.identity._replace(is_host=event['new_host_session_id'] == self.session_id)
+        await self.send_frame({
             'action': 'host_change',
             'new_host_session_id': event['new_host_session_id']
-        }))
-
-    async def round_aborted(self, event):
-        await self.send(text_data=json.dumps({
-            'action': 'error',
-            'message': f"Round Aborted: {event['reason']}"
-        }))
-        # Reset UI
-        await self.send(text_data=json.dumps({
-            'action': 'reset_round'
-        }))
+        })
+
+
+# --- Round expiry (driven by the process-wide round_scheduler) ---
+
+async def expire_round(room_code, round_id):
+    """Timeout - Thief Wins"""
+    async with metrics.track_action('round_timeout'):
+        state = await room_states.get(room_code)
+        await state.command(None, timeout_round, state, round_id)
+
+async def timeout_round(state, round_id):
+    async with state.lock:
+        result = state.resolve_timeout(round_id)
+    if not result:
+        return
+    
+    await group_broadcast(get_channel_layer(), f'room_{state.room_code}', round_result_frame(result))
+    # Sockets that closed mid-round left the room in memory for the round's sake
+    await room_states.discard_if_idle(state)
+
+async def remove_departed(state, session_id):
+    """Grace period over: remove a player who did not reconnect"""
+    async with state.lock:
+        state.departures.pop(session_id, None)
+        player = state.players.get(session_id)
+        if not player or player.online:
+            return
+        logger.info("Removing player after grace period", extra={'room': state.room_code, 'player': player.name})
+        state.remove_player(session_id)
+        version = state.roster_version
+
+    await group_broadcast(get_channel_layer(), f'room_{state.room_code}', {
+        'action': 'player_removed',
+        'player': player.to_dict(),
+        'version': version
+    })
+    await room_states.discard_if_idle(state)
+
+def round_result_frame(result):
+    return {
+        'action': 'round_ended',
+        'winner': result['winner'],
+        'thief_id': result['thief_id'],
+        'thief_name': result['thief_name'],
+        'scores': result['scores'],
+        'all_roles': result['all_roles']
+    }
+
+def session_group(room_code, session_id):
+    """Group of one session's socket: private frames (roles) and the one-socket-per-session rule"""
+    return f'session_{room_code}_{session_id}'
@@ -0,0 +1,60 @@
+"""Bounded thread pool for the game's sync DB writes.
+
+Django's async ORM and database_sync_to_async both run queries on asgiref's one
+shared sync thread, so a slow write there holds up every room's reads. Writes
+(and the room sweeper's batches) go through `db_writes` instead: at most
+GAME_DB_WRITE_THREADS run at once, and the shared thread is left to reads.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+
+class WriteExecutor:
+    def __init__(self):
+        self.executor = None
+        # Writes submitted but not yet started on a thread
+        self.queued = 0
+        self.lock = threading.Lock()
+
+    async def run(self, func, *args):
+        """Run the sync `func(*args)` on a writer thread and return its result"""
+        from .metrics import DB_WRITE_WAIT
+
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(settings.GAME_DB_WRITE_THREADS, thread_name_prefix='game-db-write')
+        submitted = time.perf_counter()
+        with self.lock:
+            self.queued += 1
+
+        def write():
+            with self.lock:
+                self.queued -= 1
+            DB_WRITE_WAIT.observe(time.perf_counter() - submitted, func.__name__)
+            try:
+                return func(*args)
+            finally:
+                # Django keeps connections per async context, so this has to run
+                # in the caller's context, as here; database_sync_to_async's own
+                # cleanup runs outside it and never sees the connection
+                close_old_connections()
+
+        return await sync_to_async(write, thread_sensitive=False, executor=self.executor)()
+
+
+db_writes = WriteExecutor()
+
+
+async def release_read_connection():
+    """Hand the async ORM thread's connection back to the DB pool.
+
+    Writer threads give theirs back after every write, but the async ORM's
+    thread otherwise only does so around page requests. Returning it after a
+    socket's reads means the next read takes a connection the pool has just
+    health-checked. Without a pool there is nothing to hand back.
+    """
+    if settings.DB_POOL_MAX_SIZE:
+        await sync_to_async(close_old_connections)()
@@ -0,0 +1,27 @@
+"""Resized AVIF/WebP copies of the PNGs under static/images.
+
+`build_images` writes them next to the collected originals and adds them to
+the staticfiles manifest; the `picture` template tag links whichever of them
+the manifest lists, so pages fall back to the PNG until the build step has run.
+"""
+from django.contrib.staticfiles.storage import staticfiles_storage
+
+IMAGE_DIR = 'images/'
+# 70px avatars and 100px role icons at 1x/2x, the 300x400 card at 1x/2x
+IMAGE_WIDTHS = (96, 192, 400, 800)
+# Smallest first: the browser uses the first <source> type it supports
+IMAGE_FORMATS = {
+    'avif': {'quality': 55, 'speed': 4},
+    'webp': {'quality': 80, 'method': 6},
+}
+
+
+def variant_name(name, width, fmt):
+    """images/card_back.png -> images/card_back.400w.webp"""
+    return f"{name.rsplit('.', 1)[0]}.{width}w.{fmt}"
+
+
+def built_widths(name, fmt):
+    """Widths of `name` the manifest has in `fmt`"""
+    hashed_files = getattr(staticfiles_storage, 'hashed_files', {})
+    return [w for w in IMAGE_WIDTHS if variant_name(name, w, fmt) in hashed_files]
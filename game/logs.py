@@ -0,0 +1,46 @@
+import atexit
+import copy
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+# Attributes every LogRecord has; anything else on a record came in through `extra=`
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+
+class StructuredFormatter(logging.Formatter):
+    """Appends the fields passed with `extra=` as key=value pairs, e.g.
+
+        logger.info("Round started", extra={'room': code, 'round': round_id})
+        -> 2026-01-01 12:00:00,000 INFO game.consumers Round started room=ABC123 round=42
+    """
+
+    def formatMessage(self, record):
+        line = super().formatMessage(record)
+        fields = ' '.join(f'{k}={v}' for k, v in vars(record).items() if k not in RECORD_ATTRIBUTES)
+        return f'{line} {fields}' if fields else line
+
+
+class BackgroundStreamHandler(QueueHandler):
+    """Queues records for a writer thread so the event loop never blocks on stream I/O.
+
+    Only the message itself is resolved on the calling thread; timestamps,
+    extra fields and tracebacks are formatted by the writer.
+    """
+
+    def __init__(self, stream=None):
+        super().__init__(queue.SimpleQueue())
+        self.target = logging.StreamHandler(stream)
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+        atexit.register(self.listener.stop)
+
+    def setFormatter(self, fmt):
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # The args may be mutated after this call returns, so pin the message now
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
@@ -0,0 +1,59 @@
+import asyncio
+import json
+import time
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand
+from game import broadcast
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmark: CPU per round_result broadcast, per-socket encoding vs encode-once"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[2, 6, 12], help='Room sizes')
+        parser.add_argument('--iterations', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        encoder = 'orjson' if broadcast.orjson is not None else 'json'
+        self.stdout.write(f"Encoder for encode-once: {encoder}")
+        self.stdout.write(f"{'players':>8} {'per-socket (µs)':>16} {'encode-once (µs)':>17} {'speedup':>8}")
+        for size in options['sizes']:
+            per_socket = asyncio.run(measure(size, options['iterations'], encode_once=False))
+            once = asyncio.run(measure(size, options['iterations'], encode_once=True))
+            self.stdout.write(f"{size:>8} {per_socket:>16.1f} {once:>17.1f} {per_socket / once:>7.1f}x")
+
+
+def round_result_payload(size):
+    names = [f'Player {i}' for i in range(size)]
+    return {
+        'action': 'round_ended',
+        'winner': 'POLICE',
+        'thief_name': names[-1],
+        'scores': [{'name': n, 'score': 1000 - i * 50, 'avatar': 'default_avatar.png'} for i, n in enumerate(names)],
+        'all_roles': [{'name': n, 'role': f'Role {i}'} for i, n in enumerate(names)],
+    }
+
+
+async def measure(size, iterations, encode_once):
+    """CPU microseconds for one group_send plus every socket's handler turning it into text"""
+    layer = InMemoryChannelLayer(capacity=iterations + 1)
+    channels = [await layer.new_channel() for _ in range(size)]
+    for channel in channels:
+        await layer.group_add('bench', channel)
+    payload = round_result_payload(size)
+
+    start = time.process_time()
+    for _ in range(iterations):
+        if encode_once:
+            await broadcast.group_broadcast(layer, 'bench', payload)
+        else:
+            # The old path: the event carries the fields and each consumer encodes them
+            await layer.group_send('bench', {'type': 'round_result', **payload})
+        for channel in channels:
+            event = await layer.receive(channel)
+            if encode_once:
+                text = event['text']
+            else:
+                text = json.dumps({k: v for k, v in event.items() if k != 'type'})
+    elapsed = time.process_time() - start
+    return elapsed / iterations * 1_000_000
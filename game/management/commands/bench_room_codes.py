@@ -0,0 +1,65 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connection
+from game.codes import room_codes
+from game.models import Room
+
+BENCH_MARK = 'bench-room-codes'
+
+
+class Command(BaseCommand):
+    help = "Benchmark the room code allocator: bare allocations and concurrent Room creations"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--codes', type=int, default=100_000, help='Codes to allocate')
+        parser.add_argument('--rooms', type=int, default=5_000, help='Rooms to create')
+        parser.add_argument('--threads', type=int, default=8)
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+
+        codes, elapsed = run_threads(threads, options['codes'], lambda: room_codes.allocate())
+        self.report('allocate', codes, elapsed)
+        if len(set(codes)) != len(codes):
+            raise CommandError(f"{len(codes) - len(set(codes))} duplicate codes")
+
+        collisions = []
+
+        def create():
+            try:
+                return Room.objects.create(host_session_id=BENCH_MARK).room_code
+            except IntegrityError:
+                collisions.append(1)
+
+        try:
+            codes, elapsed = run_threads(threads, options['rooms'], create)
+            self.report('Room.create', [c for c in codes if c], elapsed)
+        finally:
+            Room.objects.filter(host_session_id=BENCH_MARK).delete()
+        if collisions:
+            raise CommandError(f"{len(collisions)} room creations hit IntegrityError")
+        self.stdout.write(self.style.SUCCESS("✅ No duplicate codes and no IntegrityError"))
+
+    def report(self, label, codes, elapsed):
+        self.stdout.write(f"{label:<12} {len(codes):>8} in {elapsed:.2f}s = {len(codes) / elapsed:>9.0f}/s "
+                          f"({len(set(codes))} unique)")
+
+
+def run_threads(threads, count, func):
+    """Call func `count` times spread over `threads` threads; returns (results, seconds)"""
+    results = []
+    lock = threading.Lock()
+
+    def work(n):
+        local = [func() for _ in range(n)]
+        connection.close()
+        with lock:
+            results.extend(local)
+
+    shares = [count // threads + (1 if i < count % threads else 0) for i in range(threads)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(work, shares))
+    return results, time.perf_counter() - started
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from importlib import import_module
+from channels.auth import AuthMiddlewareStack
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import HttpCommunicator, WebsocketCommunicator
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from game.management.commands.load_test import STEP_TIMEOUT, QueryCounter
+from game.middleware import SessionOnlyMiddleware
+from game.models import Room, Player
+from game.routing import websocket_urlpatterns
+
+ENGINE = 'django.contrib.sessions.backends.{}'
+# (label, WebSocket middleware, session engine); the first is how asgi.py used to be set up
+SETUPS = [
+    ('AuthMiddlewareStack + db', AuthMiddlewareStack, 'db'),
+    ('session-only + cached_db', SessionOnlyMiddleware, 'cached_db'),
+    ('session-only + signed_cookies', SessionOnlyMiddleware, 'signed_cookies'),
+]
+
+
+class Command(BaseCommand):
+    help = ("Count the DB queries of a room page load and of a WebSocket connect with the old "
+            "AuthMiddlewareStack and DB sessions, and with the session-only middleware and each cached engine")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=12, help='Players (page loads and sockets) per setup')
+
+    def handle(self, *args, **options):
+        if options['players'] < 2:
+            raise CommandError("--players must be at least 2")
+        queries = QueryCounter()
+        queries.install()
+        try:
+            results = [asyncio.run(self.measure(middleware, store, options['players'], queries))
+                       for _, middleware, store in SETUPS]
+        finally:
+            queries.uninstall()
+
+        self.stdout.write(f"DB queries per request, averaged over {options['players']} players "
+                          f"(the room itself is already loaded)")
+        self.stdout.write(f"{'setup':<32} {'page load':>10} {'connect':>9}")
+        for (label, _, _), (page, connect) in zip(SETUPS, results):
+            self.stdout.write(f"{label:<32} {page:>10.1f} {connect:>9.1f}")
+
+    async def measure(self, middleware, store, player_count, queries):
+        with override_settings(SESSION_ENGINE=ENGINE.format(store)):
+            # Both read SESSION_ENGINE when built
+            http = get_asgi_application()
+            websocket = middleware(URLRouter(websocket_urlpatterns))
+            # After get_asgi_application(), whose django.setup() reapplies LOGGING
+            logging.getLogger('game').setLevel(logging.WARNING)
+
+            room_code, cookies = await create_room(player_count)
+            sockets = []
+            try:
+                # The first player's socket loads the room into memory; it is not counted
+                sockets.append(await connect(websocket, room_code, cookies[0]))
+
+                start = queries.count
+                for cookie in cookies[1:]:
+                    communicator = HttpCommunicator(http, 'GET', f'/room/{room_code}/', headers=[(b'cookie', cookie)])
+                    response = await communicator.get_response(timeout=STEP_TIMEOUT)
+                    await communicator.send_input({'type': 'http.disconnect'})
+                    await communicator.wait(timeout=STEP_TIMEOUT)
+                    if response['status'] != 200:
+                        raise CommandError(f"{store}: room page returned {response['status']}")
+                page = (queries.count - start) / (player_count - 1)
+
+                start = queries.count
+                for cookie in cookies[1:]:
+                    sockets.append(await connect(websocket, room_code, cookie))
+                per_connect = (queries.count - start) / (player_count - 1)
+            finally:
+                for communicator in sockets:
+                    await communicator.disconnect()
+                await delete_room(room_code, cookies)
+        return page, per_connect
+
+
+async def connect(application, room_code, cookie):
+    communicator = WebsocketCommunicator(application, f'/ws/room/{room_code}/', headers=[(b'cookie', cookie)])
+    connected, _ = await communicator.connect(timeout=STEP_TIMEOUT)
+    if not connected:
+        raise CommandError("WebSocket connect refused")
+    await communicator.receive_from(timeout=STEP_TIMEOUT)  # player_snapshot
+    return communicator
+
+
+@database_sync_to_async
+def create_room(player_count):
+    """A room and one saved session per player, as the join view leaves them"""
+    room = Room.objects.create()
+    cookies = []
+    for i in range(player_count):
+        store = import_module(settings.SESSION_ENGINE).SessionStore()
+        store['session_id'] = f'bench-{room.room_code}-{i}'
+        store.save()
+        Player.objects.create(room=room, session_id=store['session_id'], name=f'Bench {i}', is_host=(i == 0))
+        cookies.append(f'{settings.SESSION_COOKIE_NAME}={store.session_key}'.encode())
+    return room.room_code, cookies
+
+
+@database_sync_to_async
+def delete_room(room_code, cookies):
+    Room.objects.filter(room_code=room_code).delete()
+    for cookie in cookies:
+        import_module(settings.SESSION_ENGINE).SessionStore(session_key=cookie.decode().split('=', 1)[1]).delete()
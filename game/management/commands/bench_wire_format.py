@@ -0,0 +1,41 @@
+import asyncio
+import logging
+from django.core.management.base import BaseCommand, CommandError
+from game.management.commands.load_test import InProcessTransport, LoadTest
+
+
+class Command(BaseCommand):
+    help = ("Play the same full games in-process with JSON and with compact clients and compare "
+            "the bytes each client receives, per game and per frame type")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=4, help='Games per format')
+        parser.add_argument('--players', type=int, default=6, help='Players per game (2-12)')
+        parser.add_argument('--rounds', type=int, default=5, help='Rounds per game')
+
+    def handle(self, *args, **options):
+        if not 2 <= options['players'] <= 12:
+            raise CommandError("--players must be between 2 and 12")
+        transport = InProcessTransport()
+        # After loading the ASGI app, whose django.setup() reapplies LOGGING
+        logging.getLogger('game').setLevel(logging.WARNING)
+
+        results = {}
+        for fmt in ('json', 'compact'):
+            game = {**options, 'timeouts': 0.0, 'timer': 30, 'think': 0.0, 'protocol': fmt}
+            report = asyncio.run(LoadTest(transport, None, game).run())
+            if report['errors'] or report['games'] != options['rooms']:
+                raise CommandError(f"{fmt}: {report['errors'][:1]}")
+            results[fmt] = {action: size / report['games'] for action, size in report['bytes_by_action'].items()}
+
+        self.stdout.write(f"Bytes received per game ({options['players']} players, {options['rounds']} rounds, "
+                          f"all clients together, connect to game over)")
+        self.stdout.write(f"{'frame':<22} {'json':>9} {'compact':>9} {'saved':>7}")
+        json_sizes, compact_sizes = results['json'], results['compact']
+        for action in sorted(json_sizes, key=lambda a: -json_sizes[a]):
+            self.row(action, json_sizes[action], compact_sizes.get(action, 0))
+        self.row('total', sum(json_sizes.values()), sum(compact_sizes.values()))
+
+    def row(self, label, before, after):
+        saved = f"{1 - after / before:.0%}" if before else '-'
+        self.stdout.write(f"{label:<22} {before:>9.0f} {after:>9.0f} {saved:>7}")
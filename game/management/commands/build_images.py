@@ -0,0 +1,74 @@
+import io
+from django.contrib.staticfiles.storage import ManifestFilesMixin, staticfiles_storage
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from game.images import IMAGE_DIR, IMAGE_FORMATS, IMAGE_WIDTHS, variant_name
+
+
+class Command(BaseCommand):
+    help = ("Write resized AVIF/WebP copies of the collected PNGs under static/images with "
+            "content-hashed names and add them to the staticfiles manifest. Run after collectstatic.")
+
+    def handle(self, *args, **options):
+        try:
+            from PIL import Image, features
+        except ImportError:
+            raise CommandError("build_images needs Pillow: pip install Pillow")
+        storage = staticfiles_storage
+        if not isinstance(storage, ManifestFilesMixin):
+            raise CommandError("build_images needs a manifest staticfiles storage")
+        # The manifest maps each collected file's own name to its hashed copy
+        names = sorted(n for n in storage.hashed_files if n.startswith(IMAGE_DIR) and n.endswith('.png'))
+        if not names:
+            raise CommandError(f"No {IMAGE_DIR}*.png in the staticfiles manifest; run collectstatic first")
+
+        formats = {fmt: params for fmt, params in IMAGE_FORMATS.items() if features.check(fmt)}
+        for fmt in IMAGE_FORMATS.keys() - formats.keys():
+            self.stdout.write(self.style.WARNING(f"⚠️  This Pillow cannot write {fmt.upper()}, skipping it"))
+
+        total_before = total_after = 0
+        for name in names:
+            with storage.open(name) as f:
+                original = f.read()
+            image = Image.open(io.BytesIO(original))
+            image.load()
+
+            sizes = []
+            for width in IMAGE_WIDTHS:
+                if width > image.width:
+                    break
+                resized = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+                for fmt, params in formats.items():
+                    buffer = io.BytesIO()
+                    resized.save(buffer, fmt.upper(), **params)
+                    save_variant(storage, variant_name(name, width, fmt), buffer.getvalue())
+                    sizes.append((width, fmt, buffer.tell()))
+
+            # What a client showing the image at full size used to fetch, and fetches now
+            largest = max((w for w, _, _ in sizes), default=None)
+            after = min((n for w, _, n in sizes if w == largest), default=len(original))
+            total_before += len(original)
+            total_after += after
+            listing = ', '.join(f'{w}w.{fmt} {kb(n)}' for w, fmt, n in sizes)
+            self.stdout.write(f"🖼️  {name}: {kb(len(original))} -> {listing}")
+
+        storage.save_manifest()
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Largest variants total {kb(total_after)} instead of {kb(total_before)} "
+            f"({kb(total_before - total_after)} saved, before the smaller widths)"
+        ))
+
+
+def save_variant(storage, name, data):
+    """Store `data` under `name` and its hashed name, the way collectstatic leaves files"""
+    content = ContentFile(data)
+    hashed_name = storage.hashed_name(name, content)
+    for path in (name, hashed_name):
+        if storage.exists(path):
+            storage.delete(path)
+        storage._save(path, ContentFile(data))
+    storage.hashed_files[storage.hash_key(name)] = hashed_name
+
+
+def kb(size):
+    return f'{size / 1024:.0f} KB'
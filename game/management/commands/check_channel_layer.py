@@ -0,0 +1,206 @@
+import asyncio
+import json
+import socket
+import subprocess
+import sys
+import time
+from importlib import import_module
+from channels.db import database_sync_to_async
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from game.broadcast import group_broadcast
+from game.consumers import CLOSE_SUPERSEDED, session_group
+from game.management.commands.load_test import SocketTransport
+from game.models import Room, Player, Round
+
+# How long a Daphne worker gets to start listening
+STARTUP_SECONDS = 20
+
+
+class Command(BaseCommand):
+    help = ("Start Daphne workers as separate processes on the configured channel layer (e.g. Redis), "
+            "connect one room's sockets across them and check that room frames, private frames and the "
+            "one-socket-per-session rule reach sockets on every worker, then play a round from sockets on "
+            "every worker (each room is held by one worker, see game/affinity.py)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Daphne processes')
+        parser.add_argument('--sockets', type=int, default=3, help='Sockets per worker')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 2 or options['sockets'] < 1:
+            raise CommandError("--workers must be at least 2 and --sockets at least 1")
+        if isinstance(get_channel_layer(), InMemoryChannelLayer):
+            raise CommandError("The configured channel layer lives inside one process; "
+                               "set REDIS_URL (or CHANNEL_LAYER_BACKEND=redis) to check it across processes")
+
+        workers = [start_worker() for _ in range(options['workers'])]
+        try:
+            for process, port in workers:
+                wait_for_port(process, port)
+            self.stdout.write(f"🚀 {len(workers)} Daphne workers on ports {', '.join(str(port) for _, port in workers)}")
+            ok = asyncio.run(self.run_check([port for _, port in workers], options['sockets']))
+        finally:
+            for process, _ in workers:
+                process.terminate()
+            for process, _ in workers:
+                process.wait()
+        if not ok:
+            raise CommandError("Frames did not reach every socket")
+        self.stdout.write(self.style.SUCCESS("✅ Room frames, private frames, superseding and a round reached sockets on every worker"))
+
+    async def run_check(self, ports, sockets_per_worker):
+        transports = [SocketTransport(f'http://127.0.0.1:{port}') for port in ports]
+        room_code, sessions = await create_room(len(ports) * sockets_per_worker)
+        names = {session_id: f'Check {i}' for i, (session_id, _) in enumerate(sessions)}
+        sockets = []
+        try:
+            for i, (session_id, session_key) in enumerate(sessions):
+                worker = i % len(ports)
+                sockets.append((worker, session_id, await transports[worker].websocket(
+                    f'/ws/room/{room_code}/', f'{settings.SESSION_COOKIE_NAME}={session_key}', None)))
+            for _, _, websocket in sockets:
+                await drain(websocket)
+
+            layer = get_channel_layer()
+            ok = True
+
+            # A roster delta to the whole room
+            await group_broadcast(layer, f'room_{room_code}', {
+                'action': 'player_changed',
+                'player': {'name': 'From the check', 'avatar': '', 'session_id': ''},
+                'version': 1
+            })
+            # A role to each session's own group, as send_roles delivers them
+            for _, session_id, _ in sockets:
+                await layer.group_send(session_group(room_code, session_id), {
+                    'type': 'send_role_to_player',
+                    'target_session_id': session_id,
+                    'role': 'Check', 'description': '', 'points': 0,
+                    'is_police': False, 'is_thief': False
+                })
+            for i, (worker, session_id, websocket) in enumerate(sockets):
+                actions = [m.get('action') for m in await drain(websocket)]
+                delivered = actions.count('player_changed') == 1 and actions.count('send_role_to_player') == 1
+                ok = ok and delivered
+                self.stdout.write(f"{'✅' if delivered else '❌'} socket {i} on worker {worker}: "
+                                  f"{actions.count('player_changed')} room frame(s), "
+                                  f"{actions.count('send_role_to_player')} role frame(s)")
+
+            # The same session opening a socket on the next worker closes the first one
+            worker, _, first = sockets[0]
+            newer = await transports[(worker + 1) % len(ports)].websocket(
+                f'/ws/room/{room_code}/', f'{settings.SESSION_COOKIE_NAME}={sessions[0][1]}', None)
+            sockets.append(((worker + 1) % len(ports), sessions[0][0], newer))
+            code = await close_code(first)
+            superseded = code == CLOSE_SUPERSEDED
+            ok = ok and superseded
+            self.stdout.write(f"{'✅' if superseded else '❌'} socket 0 on worker {worker} closed with {code} "
+                              f"when its session connected to worker {(worker + 1) % len(ports)}")
+
+            # A round played from sockets on every worker; the room is held by the worker
+            # socket 0 reached first, so the host's start_game now goes through a relay
+            players = sockets[1:]
+            for _, _, websocket in players:
+                await drain(websocket)
+            await newer.send(json.dumps({'action': 'start_game'}))
+            frames = [await drain(websocket, timeout=2) for _, _, websocket in players]
+            roles = {}
+            for (worker, session_id, websocket), received in zip(players, frames):
+                actions = [m.get('action') for m in received]
+                role = [m for m in received if m.get('action') == 'send_role_to_player']
+                started = actions.count('round_started') == 1 and len(role) == 1
+                ok = ok and started
+                if role:
+                    roles[session_id] = role[0]
+                self.stdout.write(f"{'✅' if started else '❌'} {session_id} on worker {worker}: "
+                                  f"{actions.count('round_started')} round_started, {len(role)} role frame(s)")
+            playing = await rounds_in_play(room_code)
+            police = [s for s in players if roles.get(s[1], {}).get('is_police')]
+            one_round = playing == 1 and len(police) == 1
+            ok = ok and one_round
+            self.stdout.write(f"{'✅' if one_round else '❌'} {playing} round(s) in play, {len(police)} police")
+            if not one_round:
+                return ok
+
+            suspect = next(session_id for _, session_id, _ in players if session_id != police[0][1])
+            await police[0][2].send(json.dumps({'action': 'arrest', 'arrested_player': names[suspect]}))
+            for worker, session_id, websocket in players:
+                ended = [m.get('action') for m in await drain(websocket, timeout=2)].count('round_ended')
+                ok = ok and ended == 1
+                self.stdout.write(f"{'✅' if ended == 1 else '❌'} {session_id} on worker {worker}: {ended} round_ended")
+            return ok
+        finally:
+            for _, _, websocket in sockets:
+                await websocket.close()
+            await delete_room(room_code, [key for _, key in sessions])
+
+
+def start_worker():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'daphne', '-b', '127.0.0.1', '-p', str(port), 'kallanum_policum.asgi:application'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    return process, port
+
+
+def wait_for_port(process, port):
+    deadline = time.monotonic() + STARTUP_SECONDS
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError(f"The Daphne worker on port {port} exited with {process.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f"The Daphne worker on port {port} did not start within {STARTUP_SECONDS}s")
+
+
+async def drain(websocket, timeout=0.5):
+    messages = []
+    while True:
+        try:
+            messages.append(json.loads(await asyncio.wait_for(websocket.recv(), timeout)))
+        except asyncio.TimeoutError:
+            return messages
+
+
+async def close_code(websocket, timeout=2):
+    """Close code the server sent, or None if the socket stayed open"""
+    try:
+        while True:
+            await asyncio.wait_for(websocket.recv(), timeout)
+    except asyncio.TimeoutError:
+        return None
+    except Exception:
+        return websocket.close_code
+
+
+@database_sync_to_async
+def create_room(player_count):
+    room = Room.objects.create()
+    sessions = []
+    for i in range(player_count):
+        store = import_module(settings.SESSION_ENGINE).SessionStore()
+        store['session_id'] = f'check-{room.room_code}-{i}'
+        store.save()
+        Player.objects.create(room=room, session_id=store['session_id'], name=f'Check {i}', is_host=(i == 0))
+        sessions.append((store['session_id'], store.session_key))
+    return room.room_code, sessions
+
+
+@database_sync_to_async
+def rounds_in_play(room_code):
+    return Round.objects.filter(room__room_code=room_code, status='PLAYING').count()
+
+
+@database_sync_to_async
+def delete_room(room_code, session_keys):
+    Room.objects.filter(room_code=room_code).delete()
+    for key in session_keys:
+        import_module(settings.SESSION_ENGINE).SessionStore(session_key=key).delete()
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from game.management.commands.load_test import InProcessTransport, LoadTest
+
+# How often the server's connection count is sampled during the storm
+SAMPLE_SECONDS = 0.02
+# Connections the game process made; leaves out the monitor and autovacuum workers
+OTHER_CLIENTS = "datname = current_database() AND pid <> pg_backend_pid() AND backend_type = 'client backend'"
+
+
+class Command(BaseCommand):
+    help = ("Play many games at once against PostgreSQL with the connection pool on and fail if the "
+            "server ever sees more connections than DB_POOL_MAX_SIZE, or if the pool does not replace "
+            "connections the server dropped")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=12, help='Concurrent rooms')
+        parser.add_argument('--players', type=int, default=8, help='Players per room (2-12)')
+        parser.add_argument('--rounds', type=int, default=2, help='Rounds per room')
+
+    def handle(self, *args, **options):
+        if not 2 <= options['players'] <= 12:
+            raise CommandError("--players must be between 2 and 12")
+        database = connections['default']
+        if database.vendor != 'postgresql' or not database.pool:
+            raise CommandError("check_db_pool needs a PostgreSQL DATABASE_URL and DB_POOL_MAX_SIZE > 0")
+        import psycopg
+
+        transport = InProcessTransport()
+        # After loading the ASGI app, whose django.setup() reapplies LOGGING
+        logging.getLogger('game').setLevel(logging.WARNING)
+        game = {**options, 'timeouts': 0.2, 'timer': 2, 'think': 0.0}
+        # A connection of its own, outside the pool, to watch the server
+        monitor = psycopg.connect(**database.get_connection_params(), autocommit=True)
+        try:
+            self.stdout.write(f"🏁 {options['rooms']} rooms × {options['players']} players against a pool of "
+                              f"{settings.DB_POOL_MAX_SIZE}")
+            report, peak = asyncio.run(self.storm(transport, game, monitor))
+            self.check_games(report, options['rooms'])
+            self.stdout.write(f"🔌 Peak server connections from this process: {peak}")
+            if peak > settings.DB_POOL_MAX_SIZE:
+                raise CommandError(f"{peak} connections, more than DB_POOL_MAX_SIZE={settings.DB_POOL_MAX_SIZE}")
+
+            # Drop every pooled connection server-side, as a database restart would
+            dropped = terminate_others(monitor)
+            lost = database.pool.get_stats().get('connections_lost', 0)
+            self.stdout.write(f"✂️  Terminated {dropped} connections on the server, playing again")
+            report, _ = asyncio.run(self.storm(transport, {**game, 'rooms': 2}, monitor))
+            self.check_games(report, 2)
+            replaced = database.pool.get_stats().get('connections_lost', 0) - lost
+            self.stdout.write(f"🩺 Health checks replaced {replaced} dropped connections")
+        finally:
+            monitor.close()
+
+        stats = database.pool.get_stats()
+        self.stdout.write(f"📊 Pool: {stats.get('requests_num', 0)} checkouts, {stats.get('requests_queued', 0)} waited "
+                          f"({stats.get('requests_wait_ms', 0)} ms in all), {stats.get('requests_errors', 0)} timed out")
+        self.stdout.write(self.style.SUCCESS("✅ Connections stayed within the pool and dropped ones were replaced"))
+
+    async def storm(self, transport, game, monitor):
+        peak = 0
+        done = asyncio.Event()
+
+        async def sample():
+            nonlocal peak
+            while not done.is_set():
+                peak = max(peak, await asyncio.to_thread(count_others, monitor))
+                await asyncio.sleep(SAMPLE_SECONDS)
+
+        sampler = asyncio.ensure_future(sample())
+        try:
+            report = await LoadTest(transport, None, game).run()
+        finally:
+            done.set()
+            await sampler
+        return report, peak
+
+    def check_games(self, report, rooms):
+        if report['errors'] or report['games'] != rooms:
+            raise CommandError(f"{report['games']}/{rooms} games finished: {report['errors'][:3]}")
+
+
+def count_others(monitor):
+    """Client connections to this database other than the monitor's own"""
+    return monitor.execute(f"SELECT count(*) FROM pg_stat_activity WHERE {OTHER_CLIENTS}").fetchone()[0]
+
+
+def terminate_others(monitor):
+    return len(monitor.execute(f"SELECT pg_terminate_backend(pid) FROM pg_stat_activity WHERE {OTHER_CLIENTS}").fetchall())
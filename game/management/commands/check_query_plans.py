@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import re
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from game.management.commands.load_test import InProcessTransport, LoadTest, QueryCounter
+from game.models import Room, Player, Round, RoundParticipation
+
+SEED_MARK = 'plan-seed'
+# Tables that are meant to be read whole (the role catalogue is cached in memory)
+FULL_READ_TABLES = {'game_gamerole'}
+
+
+class Command(BaseCommand):
+    help = ("Play a short game in-process, EXPLAIN every statement the views and consumer issued "
+            "and fail if any of them scans a whole table, on a database seeded with finished rounds")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=100_000, help='Finished rounds to seed')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded rows for the next run')
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive',
+                            help='Do not ask to confirm that the configured database is a scratch one')
+
+    def handle(self, *args, **options):
+        if options['interactive']:
+            database = connections['default']
+            confirm = input(f"This seeds up to {options['rounds']} finished rounds into the {database.vendor} database "
+                            f"'{database.settings_dict['NAME']}', plays a game there and runs ANALYZE on its game tables.\n"
+                            f"Only run it against a scratch database. Type 'yes' to continue: ")
+            if confirm != 'yes':
+                raise CommandError("Cancelled")
+
+        seeded = Round.objects.filter(room__host_session_id=SEED_MARK).count()
+        if seeded < options['rounds']:
+            self.stdout.write(f"🌱 Seeding {options['rounds'] - seeded} finished rounds...")
+            seed_finished_rounds(options['rounds'] - seeded)
+        analyze()
+
+        recorder = QueryCounter(record=True)
+        game = {'rooms': 1, 'players': 4, 'rounds': 3, 'timeouts': 0.5, 'timer': 1, 'think': 0.0}
+        transport = InProcessTransport()
+        # After loading the ASGI app, whose django.setup() reapplies LOGGING
+        logging.getLogger('game').setLevel(logging.WARNING)
+        try:
+            report = asyncio.run(LoadTest(transport, recorder, game).run())
+            if report['errors']:
+                raise CommandError(f"The game did not finish: {report['errors'][0]}")
+
+            scans = []
+            explained = set()
+            for alias, sql, params in recorder.statements:
+                if not re.match(r'\s*(SELECT|UPDATE|DELETE)\b', sql, re.IGNORECASE) or sql in explained:
+                    continue
+                explained.add(sql)
+                tables = full_scans(connections[alias], sql, params)
+                if tables:
+                    scans.append((sql, tables))
+        finally:
+            if not options['keep']:
+                Room.objects.filter(host_session_id=SEED_MARK).delete()
+
+        self.stdout.write(f"🔎 Explained {len(explained)} distinct statements "
+                          f"out of {len(recorder.statements)} issued")
+        for sql, tables in scans:
+            self.stdout.write(self.style.ERROR(f"❌ Full scan of {', '.join(tables)}: {sql}"))
+        if scans:
+            raise CommandError(f"{len(scans)} statement(s) scan a whole table")
+        self.stdout.write(self.style.SUCCESS("✅ Every statement uses an index"))
+
+
+def seed_finished_rounds(count, rounds_per_room=10):
+    """Finished rooms with two players and `rounds_per_room` completed rounds each"""
+    room_count = -(-count // rounds_per_room)
+    with transaction.atomic():
+        rooms = Room.objects.bulk_create(
+            [Room(host_session_id=SEED_MARK, status='FINISHED') for _ in range(room_count)],
+            batch_size=2000
+        )
+        players = Player.objects.bulk_create(
+            [Player(room=room, session_id=f'{SEED_MARK}-{room.id}-{i}', name=f'Seed {i}')
+             for room in rooms for i in range(2)],
+            batch_size=2000
+        )
+        rounds = Round.objects.bulk_create(
+            [Round(room=room, round_number=n + 1, status='COMPLETED', winner='POLICE',
+                   police_player=players[2 * i], thief_player=players[2 * i + 1])
+             for i, room in enumerate(rooms) for n in range(rounds_per_room)][:count],
+            batch_size=2000
+        )
+        RoundParticipation.objects.bulk_create(
+            [RoundParticipation(round=r, player=player, role_name=role, final_score=100)
+             for r in rounds for player, role in ((r.police_player, 'Police'), (r.thief_player, 'Thief'))],
+            batch_size=2000
+        )
+
+
+def analyze():
+    """Refresh the game tables' planner statistics so the plans reflect the seeded table sizes"""
+    with connections['default'].cursor() as cursor:
+        for model in (Room, Player, Round, RoundParticipation):
+            cursor.execute(f'ANALYZE {model._meta.db_table}')
+
+
+def full_scans(connection, sql, params):
+    """Tables the plan for `sql` reads from start to end"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+        plan = [str(row[-1]) for row in cursor.fetchall()]
+
+    if connection.vendor == 'postgresql':
+        tables = [m.group(1) for line in plan for m in [re.search(r'Seq Scan on (\w+)', line)] if m]
+    else:
+        # SQLite: "SCAN game_round" reads the table; "SEARCH ... USING INDEX" and
+        # "SCAN ... USING COVERING INDEX" do not
+        tables = [m.group(1) for line in plan for m in [re.match(r'SCAN (\w+)$', line)] if m]
+    return sorted(set(tables) - FULL_READ_TABLES)
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from game.management.commands.load_test import InProcessTransport, LoadTest, cleanup
+from game.models import Round
+from game.scheduler import round_scheduler
+
+# How long to keep listening for duplicate frames after the expected ones arrived
+SETTLE_SECONDS = 0.5
+
+
+class Command(BaseCommand):
+    help = ("Have every player in several rooms press start / next round / arrest at the same time, "
+            "several times over, and fail unless each room ends up with exactly one round and one timer")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=4, help='Concurrent rooms')
+        parser.add_argument('--players', type=int, default=6, help='Players per room (2-12)')
+        parser.add_argument('--rounds', type=int, default=4, help='Rounds per room')
+        parser.add_argument('--copies', type=int, default=3, help='Times each player sends every request')
+
+    def handle(self, *args, **options):
+        if not 2 <= options['players'] <= 12:
+            raise CommandError("--players must be between 2 and 12")
+        check = RaceCheck(options)
+        # After loading the ASGI app, whose django.setup() reapplies LOGGING
+        logging.getLogger('game').setLevel(logging.WARNING)
+
+        self.stdout.write(f"🏁 {options['rooms']} rooms × {options['players']} players, "
+                          f"{options['rounds']} rounds, every request sent {options['copies']}× by everyone")
+        problems = asyncio.run(check.run())
+        for problem in problems[:20]:
+            self.stdout.write(self.style.ERROR(f"❌ {problem}"))
+        if problems:
+            raise CommandError(f"{len(problems)} race(s) found")
+        self.stdout.write(self.style.SUCCESS("✅ One round, one timer and one set of frames per room every time"))
+
+
+class RaceCheck:
+    def __init__(self, options):
+        self.options = options
+        self.problems = []
+        # Rounds stay open until someone arrests; the timer must not end them mid-check
+        self.load_test = LoadTest(InProcessTransport(), None, {
+            **options, 'timer': 120, 'think': 0.0,
+        })
+
+    async def run(self):
+        tables = await asyncio.gather(*(self.load_test.setup_room(i) for i in range(self.options['rooms'])))
+        try:
+            results = await asyncio.gather(*(self.play(table) for table in tables), return_exceptions=True)
+            for table, result in zip(tables, results):
+                if isinstance(result, Exception):
+                    self.problems.append(f"{table[0].room_code}: game stalled: {result}")
+        finally:
+            for table in tables:
+                await asyncio.gather(*(p.close() for p in table), return_exceptions=True)
+            await cleanup(
+                [table[0].room_code for table in tables],
+                [p.cookies.get(settings.SESSION_COOKIE_NAME) for table in tables for p in table]
+            )
+        return self.problems
+
+    async def play(self, players):
+        room_code = players[0].room_code
+        after_round = None
+        for number in range(1, self.options['rounds'] + 1):
+            action = 'start_game' if number == 1 else 'next_round'
+            await self.everyone_sends(players, players, {'action': action, 'after_round': after_round})
+            started, roles = await self.frames(players, ['round_started', 'send_role_to_player'], room_code, f"round {number}")
+
+            running = await playing_rounds(room_code)
+            timers = [r for r, e in round_scheduler.rounds.items() if e['group_name'] == f'room_{room_code}']
+            after_round = started[0]['round_id']
+            if running != [after_round]:
+                self.problems.append(f"{room_code} round {number}: rounds in PLAYING {running}, expected [{after_round}]")
+            if timers != [after_round]:
+                self.problems.append(f"{room_code} round {number}: timers {timers}, expected [{after_round}]")
+
+            police = [p for p, role in zip(players, roles) if role['is_police']]
+            suspect = next(p for p in players if p not in police)
+            await self.everyone_sends(players, police, {'action': 'arrest', 'arrested_player': suspect.name})
+            ended, = await self.frames(players, ['round_ended'], room_code, f"round {number} arrest")
+            if any(frame['winner'] == 'ERROR' for frame in ended):
+                self.problems.append(f"{room_code} round {number}: a duplicate arrest was resolved")
+
+        await self.everyone_sends(players, players, {'action': 'next_round', 'after_round': after_round})
+        await self.frames(players, ['game_over'], room_code, 'game over')
+
+        abandoned = await abandoned_rounds(room_code)
+        if abandoned:
+            self.problems.append(f"{room_code}: {abandoned} round(s) were started and then abandoned")
+
+    async def everyone_sends(self, players, senders, payload):
+        for p in players:
+            p.clear()
+        await asyncio.gather(*(
+            sender.send(payload)
+            for sender in senders for _ in range(self.options['copies'])
+        ))
+
+    async def frames(self, players, actions, room_code, step):
+        """Per action, every player's frame of that kind (expected in this order).
+
+        Records a problem if anyone gets a second frame of the same kind.
+        """
+        async def receive(p):
+            return [(await p.expect(action))[1] for action in actions]
+
+        received = await asyncio.gather(*(receive(p) for p in players))
+        await asyncio.sleep(SETTLE_SECONDS)
+        for p in players:
+            extra = {}
+            while not p.inbox.empty():
+                _, message = p.inbox.get_nowait()
+                if message.get('action') in actions:
+                    extra[message['action']] = extra.get(message['action'], 0) + 1
+            for action, count in extra.items():
+                self.problems.append(f"{room_code} {step}: {p.name} got {count + 1} {action} frames")
+        return [list(frames) for frames in zip(*received)]
+
+
+@database_sync_to_async
+def playing_rounds(room_code):
+    return list(Round.objects.filter(room__room_code=room_code, status='PLAYING').values_list('id', flat=True))
+
+
+@database_sync_to_async
+def abandoned_rounds(room_code):
+    return Round.objects.filter(room__room_code=room_code, status='ABANDONED').count()
@@ -0,0 +1,479 @@
+import asyncio
+import http.client
+import json
+import logging
+import random
+import re
+import threading
+import time
+from http.cookies import SimpleCookie
+from importlib import import_module
+from urllib.parse import urlencode, urlsplit
+from channels.testing import HttpCommunicator, WebsocketCommunicator
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from game import protocol
+from game.db import db_writes
+from game.models import Room
+from game.state import room_states
+
+STEP_TIMEOUT = 30
+ACTIONS = ['create', 'join', 'connect', 'start_game', 'next_round', 'arrest', 'timeout', 'game_over']
+
+
+class Command(BaseCommand):
+    help = ("Drive simulated rooms through full games (create, join, start_game, arrest or timeout, "
+            "next_round, game_over) over WebSockets and report action latency, frames/sec and DB queries per round")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=10, help='Concurrent rooms')
+        parser.add_argument('--players', type=int, default=6, help='Simulated players per room (2-12)')
+        parser.add_argument('--rounds', type=int, default=3, help='Rounds per game')
+        parser.add_argument('--timeouts', type=float, default=0.25,
+                            help='Share of rounds left to run out the timer instead of ending in an arrest')
+        parser.add_argument('--timer', type=int, default=2, help='Round timer in seconds for the simulated games')
+        parser.add_argument('--think', type=float, default=0.0,
+                            help='Seconds a simulated player waits before each action (jittered)')
+        parser.add_argument('--url', help="Drive a running server over real sockets, e.g. http://127.0.0.1:8000 "
+                                          "(needs the 'websockets' package). Default: in-process against "
+                                          "kallanum_policum.asgi:application")
+        parser.add_argument('--protocol', choices=['json', 'compact'], default='json',
+                            help=f"Wire format the simulated clients ask for ('compact' offers the {protocol.COMPACT} subprotocol)")
+        parser.add_argument('--server-output', action='store_true',
+                            help="Keep the game's INFO log lines (in-process only)")
+
+    def handle(self, *args, **options):
+        if not 2 <= options['players'] <= 12:
+            raise CommandError("--players must be between 2 and 12")
+
+        transport = SocketTransport(options['url']) if options['url'] else InProcessTransport()
+        queries = QueryCounter() if transport.in_process else None
+        if not options['server_output']:
+            logging.getLogger('game').setLevel(logging.WARNING)
+
+        self.stdout.write(f"🚦 {options['rooms']} rooms × {options['players']} players, "
+                          f"{options['rounds']} rounds each via {transport.name} ({options['protocol']} frames)")
+        report = asyncio.run(LoadTest(transport, queries, options).run())
+        self.print_report(report)
+
+    def print_report(self, report):
+        w = self.stdout.write
+        w(f"\nGames finished: {report['games']} / {report['rooms']}   "
+          f"rounds: {report['rounds']} ({report['timeouts']} by timeout)   play time: {report['play_time']:.2f}s")
+        for error in report['errors'][:5]:
+            w(self.style.ERROR(f"❌ {error}"))
+
+        w(f"\n{'action':<12} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+        for action in ACTIONS:
+            samples = sorted(report['latency'].get(action, []))
+            if not samples:
+                continue
+            p = [percentile(samples, q) * 1000 for q in (50, 95, 99, 100)]
+            w(f"{action:<12} {len(samples):>6} {p[0]:>9.1f} {p[1]:>9.1f} {p[2]:>9.1f} {p[3]:>9.1f}")
+        w("  (actions: until every player in the room has the resulting frame; "
+          "timeout: round_ended arrival after the deadline)")
+
+        w(f"\nFrames received during play: {report['frames']} ({report['frames'] / report['play_time']:.0f} frames/s), "
+          f"{report['bytes']} bytes ({report['bytes'] / max(report['games'], 1):.0f} per game)")
+        if report['queries'] is not None:
+            setup, play = report['queries']
+            players = report['rooms'] * report['players']
+            w(f"DB queries: {setup / players:.1f} per player joining, "
+              f"{play / max(report['rounds'], 1):.1f} per round played")
+        else:
+            w("DB queries: not counted (the server runs in another process)")
+
+
+class LoadTest:
+    def __init__(self, transport, queries, options):
+        self.transport = transport
+        self.queries = queries
+        self.options = options
+        self.latency = {}
+        self.errors = []
+        self.rounds = 0
+        self.timeouts = 0
+
+    def record(self, action, seconds):
+        self.latency.setdefault(action, []).append(seconds)
+
+    async def run(self):
+        rooms = self.options['rooms']
+        if self.queries:
+            self.queries.install()
+
+        # Setup every room first so the play phase runs all games concurrently
+        start_count = self.queries.count if self.queries else 0
+        results = await asyncio.gather(*(self.setup_room(i) for i in range(rooms)), return_exceptions=True)
+        tables = []
+        for result in results:
+            if isinstance(result, Exception):
+                self.errors.append(f"setup: {result!r}")
+            else:
+                tables.append(result)
+        setup_queries = (self.queries.count - start_count) if self.queries else 0
+
+        frames_before = sum(p.frames for table in tables for p in table)
+        bytes_before = sum(p.bytes for table in tables for p in table)
+        play_count = self.queries.count if self.queries else 0
+        started = time.perf_counter()
+        results = await asyncio.gather(*(self.play(table) for table in tables), return_exceptions=True)
+        if self.transport.in_process:
+            # Round results are written behind; count them with the rounds they belong to
+            for state in list(room_states.rooms.values()):
+                await state.flush()
+        play_time = time.perf_counter() - started
+        play_queries = (self.queries.count - play_count) if self.queries else 0
+        frames = sum(p.frames for table in tables for p in table) - frames_before
+        received = sum(p.bytes for table in tables for p in table) - bytes_before
+        games = 0
+        for result in results:
+            if isinstance(result, Exception):
+                self.errors.append(f"play: {result!r}")
+            else:
+                games += 1
+
+        bytes_by_action = {}
+        for p in (p for table in tables for p in table):
+            for action, size in p.bytes_by_action.items():
+                bytes_by_action[action] = bytes_by_action.get(action, 0) + size
+        for table in tables:
+            await asyncio.gather(*(p.close() for p in table), return_exceptions=True)
+        await cleanup(
+            [table[0].room_code for table in tables],
+            [p.cookies.get(settings.SESSION_COOKIE_NAME) for table in tables for p in table]
+        )
+        if self.queries:
+            self.queries.uninstall()
+
+        return {
+            'rooms': rooms,
+            'players': self.options['players'],
+            'games': games,
+            'rounds': self.rounds,
+            'timeouts': self.timeouts,
+            'play_time': play_time,
+            'frames': frames,
+            'bytes': received,
+            'bytes_by_action': bytes_by_action,
+            'latency': self.latency,
+            'errors': self.errors,
+            'queries': (setup_queries, play_queries) if self.queries else None,
+        }
+
+    async def think(self):
+        if self.options['think']:
+            await asyncio.sleep(self.options['think'] * random.uniform(0.5, 1.5))
+
+    async def setup_room(self, index):
+        compact = self.options.get('protocol') == 'compact'
+        players = [SimPlayer(self.transport, f'Sim {index}-{i}', compact) for i in range(self.options['players'])]
+        host = players[0]
+
+        started = time.perf_counter()
+        await host.submit({'action': 'create', 'name': host.name})
+        self.record('create', time.perf_counter() - started)
+
+        async def join(player):
+            await self.think()
+            started = time.perf_counter()
+            await player.submit({'action': 'join', 'name': player.name, 'room_code': host.room_code})
+            self.record('join', time.perf_counter() - started)
+
+        await asyncio.gather(*(join(p) for p in players[1:]))
+
+        async def connect(player):
+            started = time.perf_counter()
+            await player.open()
+            await player.expect('player_snapshot')
+            self.record('connect', time.perf_counter() - started)
+
+        await asyncio.gather(*(connect(p) for p in players))
+
+        await host.send({
+            'action': 'update_settings',
+            'max_rounds': self.options['rounds'],
+            'timer_duration': self.options['timer'],
+            'roles': []
+        })
+        await host.expect('settings_saved')
+        return players
+
+    async def play(self, players):
+        host = players[0]
+        action = 'start_game'
+        while True:
+            await self.think()
+            for p in players:
+                p.clear()
+            sent = time.perf_counter()
+            await host.send({'action': action})
+
+            frames = await asyncio.gather(*(p.expect('round_started', 'game_over') for p in players))
+            if frames[0][1]['action'] == 'game_over':
+                self.record('game_over', max(t for t, _ in frames) - sent)
+                return
+            deadline = frames[0][1]['deadline'] / 1000
+            roles = await asyncio.gather(*(p.expect('send_role_to_player') for p in players))
+            self.record(action, max(t for t, _ in roles) - sent)
+            self.rounds += 1
+            action = 'next_round'
+
+            if random.random() < self.options['timeouts']:
+                self.timeouts += 1
+                await asyncio.gather(*(p.expect('round_ended', timeout=self.options['timer'] + STEP_TIMEOUT)
+                                       for p in players))
+                self.record('timeout', max(p.last_wall_time for p in players) - deadline)
+                continue
+
+            police = next(p for p, (_, role) in zip(players, roles) if role['is_police'])
+            suspect = random.choice([p for p in players if p is not police])
+            await self.think()
+            sent = time.perf_counter()
+            await police.send({'action': 'arrest', 'arrested_player': suspect.name})
+            ended = await asyncio.gather(*(p.expect('round_ended') for p in players))
+            self.record('arrest', max(t for t, _ in ended) - sent)
+
+
+class SimPlayer:
+    """One browser: a cookie jar for the HTTP views plus a WebSocket"""
+
+    def __init__(self, transport, name, compact=False):
+        self.transport = transport
+        self.name = name
+        self.compact = compact
+        self.players = {}   # player_id -> player, for expanding compact frames
+        self.cookies = {}
+        self.room_code = None
+        self.session_id = None
+        self.socket = None
+        self.reader = None
+        self.inbox = asyncio.Queue()
+        self.frames = 0
+        self.bytes = 0
+        self.bytes_by_action = {}
+        self.last_wall_time = 0
+
+    async def fetch(self, method, path, data=None):
+        """Request a page, following redirects; returns (final path, body)"""
+        for _ in range(5):
+            headers = [('Host', self.transport.host)]
+            if self.cookies:
+                headers.append(('Cookie', '; '.join(f'{k}={v}' for k, v in self.cookies.items())))
+            body = b''
+            if data is not None:
+                body = urlencode(data).encode()
+                headers.append(('Content-Type', 'application/x-www-form-urlencoded'))
+            status, response_headers, content = await self.transport.request(method, path, headers, body)
+
+            for name, value in response_headers:
+                if name.lower() == 'set-cookie':
+                    for key, morsel in SimpleCookie(value).items():
+                        self.cookies[key] = morsel.value
+            if status in (301, 302, 303):
+                location = dict((k.lower(), v) for k, v in response_headers)['location']
+                path, method, data = urlsplit(location).path, 'GET', None
+                continue
+            if status != 200:
+                raise RuntimeError(f"{method} {path} returned {status}")
+            return path, content.decode()
+        raise RuntimeError(f"Too many redirects for {path}")
+
+    async def submit(self, form):
+        """Post the index page form the way the browser does and land on the room page"""
+        if 'csrftoken' not in self.cookies:
+            await self.fetch('GET', '/')
+        path, page = await self.fetch('POST', '/', {**form, 'csrfmiddlewaretoken': self.cookies['csrftoken']})
+        match = re.match(r'^/room/(\w+)/$', path)
+        if not match:
+            raise RuntimeError(f"{form['action']} did not reach a room page (ended on {path})")
+        self.room_code = match.group(1)
+        self.session_id = re.search(r'"sessionId": "([^"]*)"', page).group(1)
+
+    async def open(self):
+        cookie = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        subprotocols = [protocol.COMPACT] if self.compact else []
+        self.socket = await self.transport.websocket(f'/ws/room/{self.room_code}/', cookie, subprotocols)
+        if self.socket.subprotocol != (protocol.COMPACT if self.compact else None):
+            raise RuntimeError(f"{self.name}: server chose subprotocol {self.socket.subprotocol!r}")
+        self.reader = asyncio.ensure_future(self.read())
+
+    async def read(self):
+        while True:
+            text = await self.socket.recv()
+            size = len(text.encode())
+            self.frames += 1
+            self.bytes += size
+            self.last_wall_time = time.time()
+            message = json.loads(text)
+            if self.compact:
+                message = protocol.expand(message, self.players)
+            action = message.get('action')
+            self.bytes_by_action[action] = self.bytes_by_action.get(action, 0) + size
+            self.inbox.put_nowait((time.perf_counter(), message))
+
+    def clear(self):
+        self.inbox = asyncio.Queue()
+
+    async def expect(self, *actions, timeout=STEP_TIMEOUT):
+        """Wait for the next frame with one of `actions`, skipping anything else"""
+        async def wait():
+            while True:
+                received, message = await self.inbox.get()
+                if message.get('action') in actions:
+                    return received, message
+                if message.get('action') == 'error':
+                    raise RuntimeError(f"{self.name}: {message.get('message')}")
+        try:
+            return await asyncio.wait_for(wait(), timeout)
+        except asyncio.TimeoutError:
+            raise RuntimeError(f"{self.name} got no {'/'.join(actions)} within {timeout}s") from None
+
+    async def send(self, payload):
+        await self.socket.send(json.dumps(payload))
+
+    async def close(self):
+        if self.reader:
+            self.reader.cancel()
+        if self.socket:
+            await self.socket.close()
+
+
+class InProcessTransport:
+    """Talks to kallanum_policum.asgi:application inside this process"""
+
+    in_process = True
+    name = 'in-process ASGI application'
+    host = 'localhost'
+
+    def __init__(self):
+        from kallanum_policum.asgi import application
+        self.application = application
+
+    async def request(self, method, path, headers, body):
+        communicator = HttpCommunicator(
+            self.application, method, path, body=body,
+            headers=[(k.lower().encode(), v.encode()) for k, v in headers]
+        )
+        response = await communicator.get_response(timeout=STEP_TIMEOUT)
+        # Let the handler's disconnect listener finish like a closed browser connection
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(timeout=STEP_TIMEOUT)
+        return (
+            response['status'],
+            [(k.decode(), v.decode()) for k, v in response['headers']],
+            response['body']
+        )
+
+    async def websocket(self, path, cookie, subprotocols):
+        communicator = WebsocketCommunicator(
+            self.application, path,
+            headers=[(b'host', self.host.encode()), (b'cookie', cookie.encode())],
+            subprotocols=subprotocols
+        )
+        connected, subprotocol = await communicator.connect(timeout=STEP_TIMEOUT)
+        if not connected:
+            raise RuntimeError(f"WebSocket {path} was refused")
+        return InProcessSocket(communicator, subprotocol)
+
+
+class InProcessSocket:
+    def __init__(self, communicator, subprotocol):
+        self.communicator = communicator
+        self.subprotocol = subprotocol
+
+    async def recv(self):
+        # A timeout here would cancel the consumer, so wait as long as the game lasts
+        return await self.communicator.receive_from(timeout=3600)
+
+    async def send(self, text):
+        await self.communicator.send_to(text_data=text)
+
+    async def close(self):
+        await self.communicator.disconnect()
+
+
+class SocketTransport:
+    """Talks to a running Daphne/uvicorn server over real sockets"""
+
+    in_process = False
+
+    def __init__(self, url):
+        try:
+            from websockets.asyncio.client import connect  # websockets >= 13
+            self.headers_arg = 'additional_headers'
+        except ImportError:
+            try:
+                from websockets import connect
+                self.headers_arg = 'extra_headers'
+            except ImportError:
+                raise CommandError("--url needs the 'websockets' package: pip install websockets")
+        self.connect = connect
+        parts = urlsplit(url)
+        self.host = parts.netloc
+        self.ws_base = ('wss://' if parts.scheme == 'https' else 'ws://') + parts.netloc
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.name = url
+
+    async def request(self, method, path, headers, body):
+        def send():
+            conn = self.connection_class(self.host, timeout=STEP_TIMEOUT)
+            try:
+                conn.request(method, path, body=body or None, headers=dict(headers))
+                response = conn.getresponse()
+                return response.status, response.getheaders(), response.read()
+            finally:
+                conn.close()
+        return await asyncio.get_running_loop().run_in_executor(None, send)
+
+    async def websocket(self, path, cookie, subprotocols):
+        return await self.connect(self.ws_base + path, subprotocols=subprotocols or None,
+                                  **{self.headers_arg: [('Cookie', cookie)]})
+
+
+class QueryCounter:
+    """Counts SQL statements on every connection, whichever thread opened it"""
+
+    def __init__(self, record=False):
+        self.count = 0
+        self.record = record
+        self.statements = []
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self.lock:
+            self.count += 1
+            if self.record:
+                self.statements.append((context['connection'].alias, sql, params))
+        return execute(sql, params, many, context)
+
+    def attach(self, sender=None, connection=None, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def install(self):
+        connection_created.connect(self.attach, weak=False)
+        for connection in connections.all():
+            self.attach(connection=connection)
+
+    def uninstall(self):
+        connection_created.disconnect(self.attach)
+
+
+def percentile(samples, q):
+    """Nearest-rank percentile of a sorted list"""
+    index = max(0, min(len(samples) - 1, round(q / 100 * len(samples)) - 1))
+    return samples[index]
+
+
+async def cleanup(room_codes, session_keys):
+    await db_writes.run(delete_rooms, room_codes, session_keys)
+
+
+def delete_rooms(room_codes, session_keys):
+    Room.objects.filter(room_code__in=room_codes).delete()
+    for key in session_keys:
+        if key:
+            import_module(settings.SESSION_ENGINE).SessionStore(session_key=key).delete()
@@ -0,0 +1,67 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# A worker that exits is restarted, but no sooner than this after its last start
+RESTART_SECONDS = 2
+
+
+class Command(BaseCommand):
+    help = ("Serve the game with several Daphne workers accepting from one listening socket. "
+            "Each room is held by one worker and sockets reaching the others are relayed to it "
+            "(see game/affinity.py), so more than one worker needs REDIS_URL")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bind', default='0.0.0.0', help='Address to listen on')
+        parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 8000)),
+                            help='Port to listen on (default: $PORT or 8000)')
+        parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_CONCURRENCY', 1)),
+                            help='Daphne processes (default: $WEB_CONCURRENCY or 1)')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError("--workers must be at least 1")
+        if options['workers'] > 1 and not settings.GAME_ROOM_ROUTING:
+            raise CommandError("More than one worker needs REDIS_URL, so that every room is held by one worker")
+
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((options['bind'], options['port']))
+        listener.listen(1024)
+        # The kernel hands each new connection to whichever worker accepts first
+        module, _, name = settings.ASGI_APPLICATION.rpartition('.')
+        command = [sys.executable, '-m', 'daphne', '--fd', str(listener.fileno()), f'{module}:{name}']
+
+        def start():
+            return subprocess.Popen(command, pass_fds=(listener.fileno(),)), time.monotonic()
+
+        workers = [start() for _ in range(options['workers'])]
+        self.stdout.write(f"🚀 {len(workers)} Daphne worker(s) on {options['bind']}:{options['port']}")
+
+        stopping = False
+
+        def stop(signum, frame):
+            nonlocal stopping
+            stopping = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        try:
+            while not stopping:
+                for i, (process, started) in enumerate(workers):
+                    if process.poll() is not None and time.monotonic() - started > RESTART_SECONDS:
+                        self.stderr.write(f"Worker {process.pid} exited with {process.returncode}, restarting it")
+                        workers[i] = start()
+                time.sleep(0.5)
+        finally:
+            for process, _ in workers:
+                if process.poll() is None:
+                    process.terminate()
+            for process, _ in workers:
+                process.wait()
+            listener.close()
@@ -0,0 +1,60 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from game.sweeper import SweepTotals, archive_and_delete, archive_path, space_in_use, stale_room_ids, vacuum
+
+
+class Command(BaseCommand):
+    help = "Archive rooms with no round started within the TTL to gzipped JSONL and delete them in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl-hours', type=float, default=settings.GAME_ROOM_TTL_HOURS)
+        parser.add_argument('--batch-size', type=int, default=settings.GAME_SWEEP_BATCH_SIZE,
+                            help='Rooms per delete transaction')
+        parser.add_argument('--no-archive', action='store_true', help='Delete without writing the JSONL archive')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rooms that would be swept')
+        parser.add_argument('--vacuum', action='store_true',
+                            help='VACUUM afterwards so the freed space shows up (locks SQLite while it runs)')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['ttl_hours'])
+        path = None if options['no_archive'] else archive_path()
+
+        if options['dry_run']:
+            count, after_id = 0, 0
+            while True:
+                room_ids = stale_room_ids(cutoff, after_id, options['batch_size'])
+                if not room_ids:
+                    break
+                count += len(room_ids)
+                after_id = room_ids[-1]
+            self.stdout.write(f"🧹 {count} rooms inactive since {cutoff:%Y-%m-%d %H:%M} would be swept")
+            return
+
+        space_before = space_in_use()
+        totals = SweepTotals()
+        after_id = 0
+        while True:
+            room_ids = stale_room_ids(cutoff, after_id, options['batch_size'])
+            if not room_ids:
+                break
+            after_id = room_ids[-1]
+            totals.add(archive_and_delete(room_ids, path))
+            self.stdout.write(f"  {totals.rooms} rooms, {totals.rows} rows ({totals.rows_per_second():.0f} rows/s)")
+
+        if options['vacuum']:
+            vacuum()
+        space_after = space_in_use()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Swept {totals.rooms} rooms: {totals.rows} rows at {totals.rows_per_second():.0f} rows/s"
+        ))
+        for model, count in sorted(totals.deleted.items()):
+            self.stdout.write(f"  {model}: {count}")
+        if path and totals.rooms:
+            self.stdout.write(f"  archived to {path}")
+        if space_before is not None:
+            self.stdout.write(f"  space in use: {space_before / 1024:.0f} KiB -> {space_after / 1024:.0f} KiB "
+                              f"({(space_before - space_after) / 1024:.0f} KiB reclaimed"
+                              f"{'' if options['vacuum'] else ', more after VACUUM'})")
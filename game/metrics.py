@@ -0,0 +1,204 @@
+import bisect
+import contextlib
+import contextvars
+import threading
+import time
+from django.db.backends.signals import connection_created
+
+# Seconds; covers a cached in-memory action up to a slow DB round trip
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}']
+        with self.lock:
+            lines.extend(self.samples())
+        return lines
+
+    def label_text(self, values, extra=()):
+        pairs = list(zip(self.labels, values)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in pairs) + '}'
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        return [f'{self.name}{self.label_text(k)} {v}' for k, v in self.values.items()]
+
+
+class Gauge(Metric):
+    """A value read from `function` when the metrics are scraped"""
+    type = 'gauge'
+
+    def __init__(self, name, help, function):
+        super().__init__(name, help)
+        self.function = function
+
+    def samples(self):
+        return [f'{self.name} {self.function()}']
+
+
+class SampledCounter(Gauge):
+    """A running total kept elsewhere, read when the metrics are scraped"""
+    type = 'counter'
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def observe(self, value, *labels):
+        with self.lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [[0] * len(BUCKETS), 0.0, 0]
+            index = bisect.bisect_left(BUCKETS, value)
+            if index < len(BUCKETS):
+                entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        lines = []
+        for labels, (buckets, total, count) in self.values.items():
+            cumulative = 0
+            for bound, n in zip(BUCKETS, buckets):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{self.label_text(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{self.name}_bucket{self.label_text(labels, [("le", "+Inf")])} {count}')
+            lines.append(f'{self.name}_sum{self.label_text(labels)} {total}')
+            lines.append(f'{self.name}_count{self.label_text(labels)} {count}')
+        return lines
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def _active_rooms():
+    from .state import room_states
+    return len(room_states.rooms)
+
+
+def _open_sockets():
+    from .state import room_states
+    return sum(state.connections for state in list(room_states.rooms.values()))
+
+
+def _relayed_sockets():
+    from .affinity import room_router
+    return room_router.relays
+
+
+def _db_write_queue():
+    from .db import db_writes
+    return db_writes.queued
+
+
+def _db_pool_stat(key):
+    """One of psycopg_pool's counters for the default database's pool; 0 without a pool"""
+    from django.db import connections
+    pools = getattr(connections['default'], '_connection_pools', {})
+    pool = pools.get('default')
+    return pool.get_stats().get(key, 0) if pool else 0
+
+
+REGISTRY = []
+ACTION_SECONDS = Histogram('game_action_seconds', 'Time to handle a WebSocket action or event', ['action'])
+ACTION_DB_SECONDS = Histogram('game_action_db_seconds', 'DB time spent while handling an action', ['action'])
+ACTION_DB_QUERIES = Counter('game_action_db_queries_total', 'SQL statements run while handling actions', ['action'])
+FRAMES_SENT = Counter('game_frames_sent_total', 'WebSocket frames sent to clients')
+ROLE_FRAMES = Counter('game_role_frames_total', 'Private role frames sent at round start, one per player', ['role'])
+ACTIVE_ROOMS = Gauge('game_active_rooms', 'Rooms held in memory by this worker', _active_rooms)
+OPEN_SOCKETS = Gauge('game_open_sockets', 'Room sockets open on this worker', _open_sockets)
+RELAYED_SOCKETS = Gauge('game_relayed_sockets', 'Sockets on this worker relayed to the worker that owns their room', _relayed_sockets)
+DB_WRITE_QUEUE = Gauge('game_db_write_queue', 'DB writes waiting for a writer thread', _db_write_queue)
+DB_WRITE_WAIT = Histogram('game_db_write_wait_seconds', 'Time a DB write waited for a writer thread', ['write'])
+DB_POOL_SIZE = Gauge('game_db_pool_size', 'Connections held by the DB pool', lambda: _db_pool_stat('pool_size'))
+DB_POOL_AVAILABLE = Gauge('game_db_pool_available', 'Idle connections in the DB pool', lambda: _db_pool_stat('pool_available'))
+DB_POOL_WAITING = Gauge('game_db_pool_waiting', 'Threads waiting for a DB pool connection', lambda: _db_pool_stat('requests_waiting'))
+DB_POOL_REQUESTS = SampledCounter('game_db_pool_requests_total', 'Connections taken from the DB pool',
+                                  lambda: _db_pool_stat('requests_num'))
+DB_POOL_WAIT = SampledCounter('game_db_pool_wait_seconds_total', 'Time spent waiting for a DB pool connection',
+                              lambda: _db_pool_stat('requests_wait_ms') / 1000)
+DB_POOL_TIMEOUTS = SampledCounter('game_db_pool_timeouts_total', 'Requests that gave up waiting for a DB pool connection',
+                                  lambda: _db_pool_stat('requests_errors'))
+DB_POOL_LOST = SampledCounter('game_db_pool_connections_lost_total', 'Broken connections found by the DB pool health check',
+                              lambda: _db_pool_stat('connections_lost'))
+
+
+# --- Per-action accounting ---
+
+class ActionUsage:
+    __slots__ = ('action', 'db_seconds', 'db_queries')
+
+    def __init__(self, action):
+        self.action = action
+        self.db_seconds = 0.0
+        self.db_queries = 0
+
+
+# The usage object is shared by reference, so DB calls made through
+# sync_to_async (which copies the context into its thread) add to it too
+current_usage = contextvars.ContextVar('game_action_usage', default=None)
+
+
+@contextlib.asynccontextmanager
+async def track_action(action):
+    """Time the enclosed handler and the SQL it runs; set `.action` on the yielded usage to relabel it"""
+    usage = ActionUsage(action)
+    token = current_usage.set(usage)
+    started = time.perf_counter()
+    try:
+        yield usage
+    finally:
+        current_usage.reset(token)
+        ACTION_SECONDS.observe(time.perf_counter() - started, usage.action)
+        ACTION_DB_SECONDS.observe(usage.db_seconds, usage.action)
+        if usage.db_queries:
+            ACTION_DB_QUERIES.inc(usage.action, amount=usage.db_queries)
+
+
+def time_query(execute, sql, params, many, context):
+    usage = current_usage.get()
+    if usage is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        usage.db_seconds += time.perf_counter() - started
+        usage.db_queries += 1
+
+
+def instrument_connection(sender, connection, **kwargs):
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+connection_created.connect(instrument_connection)
@@ -0,0 +1,24 @@
+from importlib import import_module
+from django.conf import settings
+from django.http.cookie import parse_cookie
+
+
+class SessionOnlyMiddleware:
+    """Puts the Django session named by the request's cookie in scope['session'].
+
+    A stand-in for channels' AuthMiddlewareStack on the game sockets: the game
+    has no user accounts, so it skips resolving auth.User, and sockets only read
+    the session_id the HTTP views stored, so the session is never saved back.
+    The session loads lazily on first access, through whichever SESSION_ENGINE
+    is configured.
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.engine = import_module(settings.SESSION_ENGINE)
+
+    async def __call__(self, scope, receive, send):
+        cookie = next((value for name, value in scope.get('headers', []) if name == b'cookie'), b'')
+        session_key = parse_cookie(cookie.decode('latin1')).get(settings.SESSION_COOKIE_NAME)
+        scope = dict(scope, session=self.engine.SessionStore(session_key))
+        return await self.inner(scope, receive, send)
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0002_remove_gamerole_default_points_remove_player_rank_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['room', 'session_id'], name='player_room_session_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='round',
+            index=models.Index(fields=['room', 'status', '-id'], name='round_room_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='round',
+            index=models.Index(condition=models.Q(('status', 'PLAYING')), fields=['room'], name='round_playing_idx'),
+        ),
+    ]
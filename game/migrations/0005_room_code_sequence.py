@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:28
+
+import secrets
+from django.db import migrations, models
+
+
+def create_sequence(apps, schema_editor):
+    RoomCodeSequence = apps.get_model('game', 'RoomCodeSequence')
+    RoomCodeSequence.objects.create(id=1, next_value=0, key=secrets.token_hex(32))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0004_room_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomCodeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('next_value', models.BigIntegerField(default=0)),
+                ('key', models.CharField(max_length=64)),
+            ],
+        ),
+        migrations.RunPython(create_sequence, migrations.RunPython.noop),
+    ]
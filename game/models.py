@@ -1,9 +1,8 @@
 from django.db import models
-import random
-import string
 
 def generate_room_code():
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
+    from .codes import room_codes
+    return room_codes.allocate()
 
 class Room(models.Model):
     STATUS_CHOICES = [
@@ -20,6 +19,12 @@ class Room(models.Model):
     # Game Settings
     timer_duration = models.IntegerField(default=60) # Seconds per round
     max_rounds = models.IntegerField(default=5)
+
+    class Meta:
+        indexes = [
+            # The sweeper's scan for rooms past their TTL
+            models.Index(fields=['created_at'], name='room_created_idx'),
+        ]
     
     def __str__(self):
         return f"Room {self.room_code} ({self.status})"
@@ -52,6 +57,10 @@ class Player(models.Model):
 
     class Meta:
         unique_together = ('room', 'name')
+        indexes = [
+            # Session -> player lookups (room page, joins, disconnects)
+            models.Index(fields=['room', 'session_id'], name='player_room_session_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} in {self.room.room_code}"
@@ -78,6 +87,15 @@ class Round(models.Model):
     remaining_seconds = models.IntegerField(default=60)
     interrogation_used = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # A room's rounds by status, latest first
+            models.Index(fields=['room', 'status', '-id'], name='round_room_status_idx'),
+            # The few rounds in play out of every round ever finished
+            # (partial index; built where the database supports them, e.g. PostgreSQL)
+            models.Index(fields=['room'], condition=models.Q(status='PLAYING'), name='round_playing_idx'),
+        ]
+
     def __str__(self):
         return f"Round {self.round_number} in {self.room.room_code}"
 
@@ -98,3 +116,11 @@ class RoundParticipation(models.Model):
 
     def __str__(self):
         return f"{self.player.name} as {self.role_name}"
+
+class RoomCodeSequence(models.Model):
+    """Single-row counter that room codes are reserved from in blocks (see game.codes)"""
+    next_value = models.BigIntegerField(default=0)
+    key = models.CharField(max_length=64)  # Secret for the code permutation, fixed at creation
+
+    def __str__(self):
+        return f"Room codes issued: {self.next_value}"
@@ -0,0 +1,132 @@
+"""Compact wire format, negotiated per socket with the `kp.compact.v1` subprotocol.
+
+Frames are the same JSON objects as the default format, with three changes:
+
+- keys and action names are shortened through KEYS and ACTION_CODES;
+- outside the roster frames, a player is sent as just their id (`player_id`);
+  the client fills in name, avatar and session_id from the roster it keeps;
+- fields the client can rebuild (DERIVED) are left out.
+
+Client -> server messages are unchanged. static/js/room.js holds the
+inverse tables; keep the two in sync.
+"""
+
+COMPACT = 'kp.compact.v1'
+
+KEYS = {
+    'action': 'a',
+    'players': 'ps',
+    'player': 'p',
+    'version': 'v',
+    'epoch': 'e',
+    'player_id': 'i',
+    'name': 'n',
+    'avatar': 'av',
+    'session_id': 'sid',
+    'online': 'o',
+    'role': 'r',
+    'description': 'd',
+    'points': 'pt',
+    'is_police': 'ip',
+    'is_thief': 'it',
+    'all_players': 'ap',
+    'winner': 'w',
+    'thief_id': 'th',
+    'scores': 'sc',
+    'score': 's',
+    'all_roles': 'ar',
+    'round_id': 'ri',
+    'duration': 'du',
+    'deadline': 'dl',
+    'server_time': 'st',
+    'client_time': 'ct',
+    'seconds': 'se',
+    'status': 'ss',
+    'rounds_played': 'rp',
+    'max_rounds': 'mr',
+    'round': 'rd',
+    'number': 'nu',
+    'message': 'm',
+}
+
+ACTION_CODES = {
+    'player_snapshot': 1,
+    'player_added': 2,
+    'player_changed': 3,
+    'player_removed': 4,
+    'send_role_to_player': 5,
+    'round_started': 6,
+    'round_ended': 7,
+    'reset_round': 8,
+    'game_over': 9,
+    'resume': 10,
+    'clock_sync': 11,
+    'timer_tick': 12,
+    'host_change': 13,
+    'error': 14,
+}
+
+# Frames that introduce players and so carry them in full
+ROSTER_ACTIONS = {'player_snapshot', 'player_added', 'player_changed', 'player_removed'}
+# Looked up from the roster by player_id on the client
+PLAYER_FIELDS = {'name', 'avatar', 'session_id'}
+# Rebuilt on the client: the thief's name from thief_id, the role target is the socket's own player
+DERIVED = {'thief_name', 'target_session_id'}
+
+
+def compact(payload):
+    """The compact form of a server -> client frame"""
+    return _shorten(payload, payload.get('action') in ROSTER_ACTIONS)
+
+
+def _shorten(value, full_players):
+    if isinstance(value, dict):
+        collapse = not full_players and 'player_id' in value
+        out = {}
+        for key, item in value.items():
+            if key in DERIVED or (collapse and key in PLAYER_FIELDS):
+                continue
+            if key == 'action':
+                item = ACTION_CODES.get(item, item)
+            out[KEYS.get(key, key)] = _shorten(item, full_players)
+        return out
+    if isinstance(value, list):
+        return [_shorten(item, full_players) for item in value]
+    return value
+
+
+LONG_KEYS = {short: key for key, short in KEYS.items()}
+ACTIONS_BY_CODE = {code: action for action, code in ACTION_CODES.items()}
+# Stands in for a player who left before this socket saw them
+UNKNOWN = {'name': 'Unknown'}
+
+
+def expand(frame, players):
+    """A compact frame back in the default format, as room.js does it.
+
+    `players` maps player_id -> player dict; it is updated from roster frames,
+    so pass the same dict for every frame of a socket. Role descriptions left
+    out of repeat send_role_to_player frames are not filled back in.
+    """
+    frame = _lengthen(frame, players)
+    action = frame.get('action')
+    if action in ROSTER_ACTIONS:
+        for player in frame['players'] if 'players' in frame else [frame['player']]:
+            players[player['player_id']] = player
+    if 'thief_id' in frame:
+        frame['thief_name'] = players.get(frame['thief_id'], UNKNOWN)['name']
+    return frame
+
+
+def _lengthen(value, players):
+    if isinstance(value, dict):
+        out = {LONG_KEYS.get(key, key): _lengthen(item, players) for key, item in value.items()}
+        if 'action' in out:
+            out['action'] = ACTIONS_BY_CODE.get(out['action'], out['action'])
+        if 'player_id' in out and 'name' not in out:
+            player = players.get(out['player_id'], UNKNOWN)
+            out.update({field: player.get(field) for field in PLAYER_FIELDS})
+        return out
+    if isinstance(value, list):
+        return [_lengthen(item, players) for item in value]
+    return value
@@ -0,0 +1,54 @@
+import threading
+import time
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import GameRole
+
+
+class RoleCatalogue:
+    """In-process cache of the GameRole table.
+
+    Role definitions change only through the settings modal or the admin, so
+    rounds read them from here instead of querying GameRole every time. Saves
+    and deletes in this process invalidate the cache immediately; the TTL
+    bounds how stale another worker's copy can get.
+    """
+
+    def __init__(self):
+        self.roles = None
+        self.loaded_at = 0
+        self.lock = threading.Lock()
+
+    def all(self):
+        ttl = getattr(settings, 'ROLE_CACHE_TTL', 60)
+        with self.lock:
+            if self.roles is None or time.monotonic() - self.loaded_at > ttl:
+                self.roles = list(GameRole.objects.order_by('id'))
+                self.loaded_at = time.monotonic()
+            return list(self.roles)
+
+    async def aall(self):
+        """all() for async code: a stale cache is reloaded through the async ORM"""
+        ttl = getattr(settings, 'ROLE_CACHE_TTL', 60)
+        with self.lock:
+            roles = self.roles if time.monotonic() - self.loaded_at <= ttl else None
+        if roles is None:
+            roles = [r async for r in GameRole.objects.order_by('id')]
+            with self.lock:
+                self.roles = roles
+                self.loaded_at = time.monotonic()
+        return list(roles)
+
+    def invalidate(self):
+        with self.lock:
+            self.roles = None
+
+
+role_catalogue = RoleCatalogue()
+
+
+@receiver(post_save, sender=GameRole)
+@receiver(post_delete, sender=GameRole)
+def invalidate_role_catalogue(sender, **kwargs):
+    role_catalogue.invalidate()
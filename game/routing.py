@@ -1,6 +1,7 @@
 from django.urls import re_path
 from . import consumers
+from .affinity import RoomAffinityMiddleware
 
 websocket_urlpatterns = [
-    re_path(r'ws/room/(?P<room_code>\w+)/$', consumers.GameConsumer.as_asgi()),
+    re_path(r'ws/room/(?P<room_code>\w+)/$', RoomAffinityMiddleware(consumers.GameConsumer.as_asgi())),
 ]
@@ -0,0 +1,135 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from channels.layers import get_channel_layer
+from django.conf import settings
+from .broadcast import group_broadcast
+
+logger = logging.getLogger(__name__)
+
+
+class RoundScheduler:
+    """One process-wide timer loop for every active round.
+
+    Rounds are kept in a heap ordered by their next wakeup. A single asyncio
+    task sleeps until the earliest one is due and calls the round's on_expire
+    callback when the countdown reaches zero. Cancelling a round only drops it
+    from memory; stale heap entries are skipped.
+
+    With GAME_TIMER_MODE = 'deadline' (the default) a round only wakes the loop
+    once, at its deadline, and clients count down locally from the deadline.
+    With 'ticks' every second is broadcast to the room as a timer_update.
+    """
+
+    def __init__(self):
+        self.heap = []      # (fire_at, seq, round_id)
+        self.rounds = {}    # round_id -> {'group_name', 'deadline', 'seconds', 'ticks', 'on_expire'}
+        self.seq = itertools.count()
+        self.task = None
+        self.wakeup = None
+
+    def schedule(self, round_id, group_name, duration, on_expire):
+        """Start the countdown for a round, replacing any other round of the same room.
+
+        Returns the round's deadline as a unix timestamp (server clock).
+        """
+        for other_id, entry in list(self.rounds.items()):
+            if entry['group_name'] == group_name:
+                self.cancel(other_id)
+
+        ticks = getattr(settings, 'GAME_TIMER_MODE', 'deadline') == 'ticks'
+        deadline = time.time() + duration
+        self.rounds[round_id] = {
+            'group_name': group_name,
+            'deadline': deadline,
+            'seconds': duration,
+            'ticks': ticks,
+            'on_expire': on_expire,
+        }
+        self._ensure_running()
+        now = asyncio.get_running_loop().time()
+        self._push(now if ticks else now + duration, round_id)
+        return deadline
+
+    def cancel(self, round_id):
+        if self.rounds.pop(round_id, None) is not None:
+            logger.debug("Timer cancelled", extra={'round': round_id})
+
+    def is_active(self, round_id):
+        return round_id in self.rounds
+
+    def deadline_for_group(self, group_name):
+        """Deadline of the room's running round, or None if no round is running"""
+        for entry in self.rounds.values():
+            if entry['group_name'] == group_name:
+                return entry['deadline']
+        return None
+
+    def _push(self, fire_at, round_id):
+        heapq.heappush(self.heap, (fire_at, next(self.seq), round_id))
+        self.wakeup.set()
+
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self.task and not self.task.done() and self.task.get_loop() is loop:
+            return
+        # Entries from a previous (closed) event loop can never fire
+        self.heap = [e for e in self.heap if e[2] in self.rounds]
+        heapq.heapify(self.heap)
+        self.wakeup = asyncio.Event()
+        self.task = loop.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        channel_layer = get_channel_layer()
+
+        while True:
+            if not self.heap:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            fire_at, _, round_id = self.heap[0]
+            delay = fire_at - loop.time()
+            if delay > 0:
+                # Sleep until the next tick, or until an earlier one is scheduled
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self.heap)
+            entry = self.rounds.get(round_id)
+            if entry is None:
+                continue
+
+            if entry['ticks']:
+                try:
+                    await group_broadcast(channel_layer, entry['group_name'], {
+                        'action': 'timer_tick',
+                        'seconds': entry['seconds']
+                    })
+                except Exception:
+                    logger.exception("Timer tick failed", extra={'round': round_id})
+
+            if not entry['ticks'] or entry['seconds'] <= 0:
+                logger.debug("Timer expired", extra={'round': round_id})
+                del self.rounds[round_id]
+                # Don't hold up other rooms' ticks while the round is scored
+                loop.create_task(self._expire(round_id, entry))
+            else:
+                entry['seconds'] -= 1
+                self._push(fire_at + 1, round_id)
+
+    async def _expire(self, round_id, entry):
+        try:
+            await entry['on_expire'](round_id)
+        except Exception:
+            logger.exception("Round expiry failed", extra={'round': round_id})
+
+
+round_scheduler = RoundScheduler()
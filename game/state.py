@@ -0,0 +1,445 @@
+import asyncio
+import contextvars
+import logging
+import secrets
+from django.db import transaction
+from django.db.models import BooleanField, Case, F, IntegerField, Value, When
+from .affinity import room_router
+from .db import db_writes, release_read_connection
+from .models import Room, Player, Round, RoundParticipation
+
+logger = logging.getLogger(__name__)
+
+
+class PlayerState:
+    def __init__(self, player):
+        self.id = player.id
+        self.session_id = player.session_id
+        self.name = player.name
+        self.avatar = player.avatar
+        self.is_host = player.is_host
+        self.total_score = player.total_score
+        # Presence lives in memory only: online while at least one socket is open
+        self.sockets = 0
+        self.online = False
+
+    def to_dict(self):
+        return {'player_id': self.id, 'name': self.name, 'avatar': self.avatar, 'session_id': self.session_id, 'online': self.online}
+
+
+class RoundState:
+    def __init__(self, round_id, number, roles, status='PLAYING', restored_deadline=None):
+        self.id = round_id
+        self.number = number
+        self.status = status
+        # Unix time a round loaded from the DB mid-play runs out; its timer has to be restarted
+        self.restored_deadline = restored_deadline
+        self.winner = None
+        # session_id -> {'player_id', 'name', 'role', 'description', 'points', 'is_police', 'is_thief'}
+        self.roles = roles
+        self.police_session_id = next((s for s, r in roles.items() if r['is_police']), None)
+        self.thief_session_id = next((s for s, r in roles.items() if r['is_thief']), None)
+
+
+class RoomState:
+    """Authoritative in-memory copy of an active room.
+
+    The consumer reads and mutates this instead of querying the ORM on every
+    action. Mutations must be made while holding `lock`; the matching DB
+    writes are queued with `persist` and applied in order in the background.
+    Actions that change the game (starting a round, arrests, timeouts,
+    settings) go through `command`, which runs them one at a time per room.
+    """
+
+    def __init__(self, room, players, rounds_played, current_round):
+        self.id = room.id
+        self.room_code = room.room_code
+        self.status = room.status
+        self.max_rounds = room.max_rounds
+        self.timer_duration = room.timer_duration
+        self.players = {p.session_id: PlayerState(p) for p in players}
+        # Bumped on every roster change so clients can spot missed deltas; the
+        # epoch tells a reconnecting client whether its version is from this copy
+        self.roster_version = 0
+        self.epoch = secrets.token_hex(4)
+        self.rounds_played = rounds_played
+        self.current_round = current_round
+
+        self.lock = asyncio.Lock()
+        self.connections = 0
+        # session_id -> TimerHandle that removes a disconnected player once the grace period ends
+        self.departures = {}
+        self.pending_writes = asyncio.Queue()
+        self.writer_task = None
+        self.commands = asyncio.Queue()
+        self.queued_commands = {}   # key -> future of a command that has not started yet
+        self.command_task = None
+
+    # --- Reads ---
+
+    def player_list(self):
+        return [p.to_dict() for p in self.players.values()]
+
+    def roster_snapshot(self):
+        return {'players': self.player_list(), 'version': self.roster_version, 'epoch': self.epoch}
+
+    def player_by_name(self, name):
+        return next((p for p in self.players.values() if p.name == name), None)
+
+    def can_start_round(self):
+        return self.rounds_played < self.max_rounds
+
+    def is_police(self, session_id):
+        current_round = self.current_round
+        if not current_round or current_round.status != 'PLAYING':
+            return False
+        return current_round.police_session_id == session_id
+
+    def last_round_roles(self):
+        """(police player id, thief player id) of the latest round, for the smart shuffle"""
+        last_round = self.current_round
+        if not last_round:
+            return None, None
+        police = last_round.roles.get(last_round.police_session_id)
+        thief = last_round.roles.get(last_round.thief_session_id)
+        return (police['player_id'] if police else None), (thief['player_id'] if thief else None)
+
+    def scores(self):
+        players = sorted(self.players.values(), key=lambda p: -p.total_score)
+        return [{'player_id': p.id, 'name': p.name, 'score': p.total_score, 'avatar': p.avatar} for p in players]
+
+    def resume_frame(self, session_id, deadline=None):
+        """What a (re)connecting player missed: game progress, scores and their role in the running round"""
+        frame = {
+            'action': 'resume',
+            'status': self.status,
+            'rounds_played': self.rounds_played,
+            'max_rounds': self.max_rounds,
+            'scores': self.scores(),
+            'round': None,
+        }
+        current_round = self.current_round
+        if current_round and current_round.status == 'PLAYING':
+            frame['round'] = {
+                'round_id': current_round.id,
+                'number': current_round.number,
+                'deadline': int(deadline * 1000) if deadline else None,
+            }
+            role = current_round.roles.get(session_id)
+            if role:
+                frame['role'] = {
+                    'role': role['role'],
+                    'description': role['description'],
+                    'points': role['points'],
+                    'is_police': role['is_police'],
+                    'is_thief': role['is_thief'],
+                    'all_players': [
+                        {'player_id': r['player_id'], 'name': r['name'], 'session_id': s,
+                         'avatar': self.players[s].avatar if s in self.players else 'default_avatar.png'}
+                        for s, r in current_round.roles.items()
+                    ] if role['is_police'] else None,
+                }
+        return frame
+
+    # --- Mutations (hold self.lock) ---
+
+    def player_connected(self, player):
+        """Add or refresh the player behind a new socket and mark them online.
+
+        Cancels a pending removal if they come back within the grace period.
+        Returns the roster delta op, or None if nothing changed.
+        """
+        departure = self.departures.pop(player.session_id, None)
+        if departure:
+            departure.cancel()
+
+        existing = self.players.get(player.session_id)
+        if existing:
+            existing.sockets += 1
+            if existing.online and (existing.name, existing.avatar, existing.is_host) == (player.name, player.avatar, player.is_host):
+                return None
+            # Score in memory may be ahead of the DB (pending writes)
+            existing.name = player.name
+            existing.avatar = player.avatar
+            existing.is_host = player.is_host
+            existing.online = True
+            op = 'player_changed'
+        else:
+            state = PlayerState(player)
+            state.sockets = 1
+            state.online = True
+            self.players[player.session_id] = state
+            op = 'player_added'
+        self.roster_version += 1
+        return op
+
+    def player_disconnected(self, session_id):
+        """Mark the player offline once their last socket closes; returns them if they went offline"""
+        player = self.players.get(session_id)
+        if not player or player.sockets == 0:
+            return None
+        player.sockets -= 1
+        if player.sockets > 0:
+            return None
+        player.online = False
+        self.roster_version += 1
+        return player
+
+    def remove_player(self, session_id):
+        player = self.players.pop(session_id, None)
+        if player:
+            self.roster_version += 1
+            self.persist(delete_player, player.id)
+        return player
+
+    def update_settings(self, max_rounds, timer_duration):
+        self.max_rounds = max_rounds
+        self.timer_duration = timer_duration
+
+    def begin_round(self, game_data):
+        roles = {p['session_id']: p for p in game_data['players']}
+        self.current_round = RoundState(game_data['round_id'], game_data['round_number'], roles)
+        self.rounds_played += 1
+        self.status = 'IN_PROGRESS'
+
+    def resolve_arrest(self, arrested_player_name):
+        current_round = self.current_round
+        if not current_round or current_round.status != 'PLAYING':
+            return {'winner': 'ERROR', 'thief_name': '', 'scores': [], 'all_roles': []}
+
+        arrested = self.player_by_name(arrested_player_name)
+        arrested_session_id = arrested.session_id if arrested else None
+
+        if arrested_session_id and arrested_session_id == current_round.thief_session_id:
+            return self._complete_round('POLICE', caught=arrested_session_id)
+        return self._complete_round('THIEF', wrongly_accused=arrested_session_id)
+
+    def resolve_timeout(self, round_id):
+        current_round = self.current_round
+        # The police may have made an arrest while the timer was expiring
+        if not current_round or current_round.id != round_id or current_round.status != 'PLAYING':
+            return None
+        return self._complete_round('THIEF')
+
+    def finish_game(self):
+        self.status = 'FINISHED'
+        self.persist(save_room_status, self.id, 'FINISHED')
+        return [{'player_id': s['player_id'], 'name': s['name'], 'score': s['score']} for s in self.scores()]
+
+    def _complete_round(self, winner, caught=None, wrongly_accused=None):
+        current_round = self.current_round
+        current_round.status = 'COMPLETED'
+        current_round.winner = winner
+
+        results = []
+        all_roles = []
+        for session_id, role in current_round.roles.items():
+            if role['is_police']:
+                final_score = role['points'] if winner == 'POLICE' else 0
+            elif role['is_thief']:
+                final_score = role['points'] if winner == 'THIEF' else 0
+            else:
+                # Civilians always get points
+                final_score = role['points']
+
+            player = self.players.get(session_id)
+            if player:
+                player.total_score += final_score
+
+            results.append({
+                'player_id': role['player_id'],
+                'final_score': final_score,
+                'is_caught': session_id == caught,
+                'is_wrongly_accused': session_id == wrongly_accused,
+            })
+            all_roles.append({'player_id': role['player_id'], 'name': role['name'], 'role': role['role']})
+
+        self.persist(save_round_result, current_round.id, winner, results)
+
+        thief = current_round.roles.get(current_round.thief_session_id)
+        return {
+            'round_id': current_round.id,
+            'winner': winner,
+            'thief_id': thief['player_id'] if thief else None,
+            'thief_name': thief['name'] if thief else "Unknown",
+            'scores': self.scores(),
+            'all_roles': all_roles
+        }
+
+    # --- Command queue ---
+
+    def command(self, key, func, *args):
+        """Run the coroutine function `func(*args)` after every command queued before it.
+
+        A command whose `key` matches one that is still waiting is not queued
+        again; the caller shares the waiting one's result instead. Returns an
+        awaitable for the result.
+        """
+        future = self.queued_commands.get(key) if key else None
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            # Run it in the caller's context so its metrics are charged to the right action
+            self.commands.put_nowait((key, func, args, future, contextvars.copy_context()))
+            if key:
+                self.queued_commands[key] = future
+            if self.command_task is None or self.command_task.done():
+                self.command_task = asyncio.get_running_loop().create_task(self._run_commands())
+        # A caller that goes away must not cancel the command for everyone else
+        return asyncio.shield(future)
+
+    async def _run_commands(self):
+        while not self.commands.empty():
+            key, func, args, future, context = self.commands.get_nowait()
+            if self.queued_commands.get(key) is future:
+                del self.queued_commands[key]
+            try:
+                result = await context.run(asyncio.ensure_future, func(*args))
+            except Exception as e:
+                # Reported by whoever awaits the command
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
+    # --- Write-behind persistence ---
+
+    def persist(self, func, *args):
+        """Queue a sync DB write; writes for a room are applied in order"""
+        self.pending_writes.put_nowait((func, args))
+        if self.writer_task is None or self.writer_task.done():
+            self.writer_task = asyncio.get_running_loop().create_task(self._write_pending())
+
+    async def flush(self):
+        """Wait until every queued write has reached the database"""
+        await self.pending_writes.join()
+
+    async def _write_pending(self):
+        while not self.pending_writes.empty():
+            func, args = self.pending_writes.get_nowait()
+            try:
+                await db_writes.run(func, *args)
+            except Exception:
+                logger.exception("Write-behind %s failed", func.__name__, extra={'room': self.room_code})
+            finally:
+                self.pending_writes.task_done()
+
+
+class RoomStateRegistry:
+    """Process-wide map of room_code -> RoomState for rooms with live sockets"""
+
+    def __init__(self):
+        self.rooms = {}
+        self.loading = {}
+
+    async def get(self, room_code):
+        state = self.rooms.get(room_code)
+        if state:
+            return state
+
+        # Concurrent connects to a cold room share a single load
+        future = self.loading.get(room_code)
+        if future is None:
+            future = asyncio.ensure_future(self._load(room_code))
+            self.loading[room_code] = future
+        try:
+            return await future
+        finally:
+            self.loading.pop(room_code, None)
+
+    async def _load(self, room_code):
+        try:
+            snapshot = await load_room_snapshot(room_code)
+        finally:
+            # This task has its own DB connection (Django's are per async context)
+            await release_read_connection()
+        state = RoomState(*snapshot)
+        self.rooms[room_code] = state
+        return state
+
+    async def release(self, state):
+        """Drop a room from memory once its last socket has gone and writes are flushed"""
+        state.connections -= 1
+        if state.connections > 0:
+            return
+        await self.discard_if_idle(state)
+
+    async def discard_if_idle(self, state):
+        """Drop a room with no sockets, no running round and no seats held for reconnects"""
+        await state.flush()
+        round_running = state.current_round and state.current_round.status == 'PLAYING'
+        if (state.connections <= 0 and not round_running and not state.departures
+                and self.rooms.get(state.room_code) is state):
+            del self.rooms[state.room_code]
+            await room_router.release(state.room_code)
+
+
+room_states = RoomStateRegistry()
+
+
+# --- DB loaders and writers (run in the sync thread pool) ---
+
+async def load_room_snapshot(room_code):
+    room = await Room.objects.aget(room_code=room_code)
+    players = [p async for p in room.players.all()]
+    rounds_played = await room.rounds.acount()
+
+    # Latest round: the one in play, or the last one (for the smart shuffle)
+    current_round = None
+    round_obj = await room.rounds.order_by('-id').afirst()
+    if round_obj:
+        roles = {}
+        async for p in round_obj.participations.select_related('player'):
+            roles[p.player.session_id] = {
+                'player_id': p.player_id,
+                'session_id': p.player.session_id,
+                'name': p.player.name,
+                'role': p.role_name,
+                'description': p.role_description,
+                'points': p.win_points,
+                'is_police': p.player_id == round_obj.police_player_id,
+                'is_thief': p.player_id == round_obj.thief_player_id,
+            }
+        deadline = None
+        if round_obj.status == 'PLAYING':
+            # The timer was lost with the process that started the round
+            deadline = round_obj.started_at.timestamp() + room.timer_duration
+        current_round = RoundState(round_obj.id, round_obj.round_number, roles, round_obj.status, deadline)
+
+    return room, players, rounds_played, current_round
+
+async def load_player(room_id, session_id):
+    return await Player.objects.filter(room_id=room_id, session_id=session_id).afirst()
+
+def delete_player(player_id):
+    Player.objects.filter(id=player_id).delete()
+
+
+def save_room_status(room_id, status):
+    Room.objects.filter(id=room_id).update(status=status)
+
+def save_round_result(round_id, winner, results):
+    """Write a round's scores in one transaction with a fixed number of queries"""
+    player_ids = [r['player_id'] for r in results]
+
+    def per_player(field, output_field):
+        return Case(
+            *[When(player_id=r['player_id'], then=Value(r[field])) for r in results],
+            default=F(field),
+            output_field=output_field
+        )
+
+    with transaction.atomic():
+        Round.objects.filter(id=round_id).update(winner=winner, status='COMPLETED')
+        RoundParticipation.objects.filter(round_id=round_id, player_id__in=player_ids).update(
+            final_score=per_player('final_score', IntegerField()),
+            is_caught=per_player('is_caught', BooleanField()),
+            is_wrongly_accused=per_player('is_wrongly_accused', BooleanField())
+        )
+        Player.objects.filter(id__in=player_ids).update(
+            total_score=F('total_score') + Case(
+                *[When(id=r['player_id'], then=Value(r['final_score'])) for r in results],
+                default=Value(0),
+                output_field=IntegerField()
+            )
+        )
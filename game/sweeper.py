@@ -0,0 +1,171 @@
+import asyncio
+import gzip
+import json
+import os
+import logging
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from .db import db_writes
+from .models import Room, Player, Round, RoundParticipation
+from .state import room_states
+
+logger = logging.getLogger(__name__)
+
+
+class RoomSweeper:
+    """Periodically archives and deletes rooms nobody has played in for GAME_ROOM_TTL_HOURS.
+
+    Runs inside the worker when GAME_SWEEP_INTERVAL (seconds) is set. Batches
+    run on the DB writer threads so a sweep never holds up the consumers' reads,
+    and rooms still held in memory by this worker are skipped.
+    """
+
+    def __init__(self):
+        self.task = None
+
+    def ensure_running(self):
+        interval = settings.GAME_SWEEP_INTERVAL
+        if not interval:
+            return
+        loop = asyncio.get_running_loop()
+        if self.task and not self.task.done() and self.task.get_loop() is loop:
+            return
+        self.task = loop.create_task(self._run(interval))
+
+    async def _run(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Room sweep failed")
+
+    async def sweep(self):
+        cutoff = timezone.now() - timedelta(hours=settings.GAME_ROOM_TTL_HOURS)
+        totals = SweepTotals()
+        after_id = 0
+        while True:
+            room_ids = await db_writes.run(
+                stale_room_ids, cutoff, after_id, settings.GAME_SWEEP_BATCH_SIZE, set(room_states.rooms)
+            )
+            if not room_ids:
+                break
+            after_id = room_ids[-1]
+            totals.add(await db_writes.run(archive_and_delete, room_ids, archive_path()))
+        if totals.rooms:
+            logger.info("Swept %d rooms (%d rows, %.0f rows/s)", totals.rooms, totals.rows, totals.rows_per_second())
+        return totals
+
+
+room_sweeper = RoomSweeper()
+
+
+class SweepTotals:
+    def __init__(self):
+        self.rooms = 0
+        self.rows = 0
+        self.deleted = {}
+        self.started = time.perf_counter()
+
+    def add(self, deleted):
+        for model, count in deleted.items():
+            self.deleted[model] = self.deleted.get(model, 0) + count
+            self.rows += count
+        self.rooms += deleted.get('game.Room', 0)
+
+    def rows_per_second(self):
+        return self.rows / max(time.perf_counter() - self.started, 1e-9)
+
+
+def archive_path():
+    """Append-only gzipped JSONL file for today's archived rooms, or None when archiving is off"""
+    directory = settings.GAME_ARCHIVE_DIR
+    if not directory:
+        return None
+    return os.path.join(str(directory), f"rooms-{timezone.now():%Y-%m-%d}.jsonl.gz")
+
+
+def stale_room_ids(cutoff, after_id, limit, exclude_codes=()):
+    """Ids of rooms created before `cutoff` with no round started since, in id order"""
+    recent_round = Round.objects.filter(room=OuterRef('pk'), started_at__gte=cutoff)
+    rooms = (Room.objects
+             .filter(created_at__lt=cutoff, id__gt=after_id)
+             .exclude(Exists(recent_round))
+             .exclude(room_code__in=exclude_codes)
+             .order_by('id'))
+    return list(rooms.values_list('id', flat=True)[:limit])
+
+
+def archive_and_delete(room_ids, path=None):
+    """Write one JSONL record per room, then delete the rooms and everything under them.
+
+    The archive is written and synced before the delete commits, so a failure
+    can at worst leave a room archived twice, never lost.
+    Returns Django's per-model delete counts.
+    """
+    with transaction.atomic():
+        if path:
+            lines = ''.join(json.dumps(r, separators=(',', ':'), default=str) + '\n' for r in room_records(room_ids))
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            # One gzip member per batch; zcat and gzip.open read the members back as one stream
+            with open(path, 'ab') as archive:
+                archive.write(gzip.compress(lines.encode()))
+                archive.flush()
+                os.fsync(archive.fileno())
+        _, deleted = Room.objects.filter(id__in=room_ids).delete()
+    return deleted
+
+
+def room_records(room_ids):
+    """Compact archive records: room settings, final scores and every round's roles"""
+    rooms = {r['id']: {**r, 'players': [], 'rounds': []} for r in Room.objects.filter(id__in=room_ids).values(
+        'id', 'room_code', 'status', 'created_at', 'max_rounds', 'timer_duration')}
+    for p in Player.objects.filter(room_id__in=room_ids).values(
+            'id', 'room_id', 'name', 'avatar', 'total_score', 'is_host').order_by('id'):
+        rooms[p.pop('room_id')]['players'].append(p)
+
+    rounds = {}
+    for r in Round.objects.filter(room_id__in=room_ids).values(
+            'id', 'room_id', 'round_number', 'status', 'winner', 'started_at',
+            'police_player_id', 'thief_player_id').order_by('id'):
+        r['roles'] = []
+        rounds[r['id']] = r
+        rooms[r.pop('room_id')]['rounds'].append(r)
+    for p in RoundParticipation.objects.filter(round__room_id__in=room_ids).values(
+            'round_id', 'player_id', 'role_name', 'final_score', 'is_caught', 'is_wrongly_accused').order_by('id'):
+        rounds[p.pop('round_id')]['roles'].append(p)
+
+    archived_at = timezone.now()
+    return [{**room, 'archived_at': archived_at} for room in rooms.values()]
+
+
+def space_in_use():
+    """Bytes the game tables occupy (PostgreSQL) or the database file uses (SQLite), if known"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            tables = [m._meta.db_table for m in (Room, Player, Round, RoundParticipation)]
+            cursor.execute('SELECT SUM(pg_total_relation_size(t::regclass)) FROM unnest(%s) AS t', [tables])
+            return int(cursor.fetchone()[0] or 0)
+        if connection.vendor == 'sqlite':
+            cursor.execute('PRAGMA page_count')
+            pages = cursor.fetchone()[0]
+            cursor.execute('PRAGMA freelist_count')
+            free = cursor.fetchone()[0]
+            cursor.execute('PRAGMA page_size')
+            return (pages - free) * cursor.fetchone()[0]
+    return None
+
+
+def vacuum():
+    """Return freed pages to the OS (SQLite) or refresh the free space map (PostgreSQL)"""
+    tables = [m._meta.db_table for m in (Room, Player, Round, RoundParticipation)]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for table in tables:
+                cursor.execute(f'VACUUM ANALYZE {connection.ops.quote_name(table)}')
+        elif connection.vendor == 'sqlite':
+            cursor.execute('VACUUM')
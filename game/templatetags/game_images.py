@@ -0,0 +1,26 @@
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+from ..images import IMAGE_FORMATS, built_widths, variant_name
+
+register = template.Library()
+
+
+@register.simple_tag
+def picture(name, sizes, **attrs):
+    """A static PNG as <picture>, offering its AVIF/WebP variants at every built width.
+
+        {% picture 'images/card_back.png' sizes='300px' class='card-art' %}
+
+    Extra keyword arguments become attributes of the <img>. The <picture>
+    itself is display: contents so the <img> keeps its place in the layout.
+    """
+    sources = format_html_join('', '<source type="image/{}" srcset="{}" sizes="{}">', (
+        (fmt, ', '.join(f'{static(variant_name(name, w, fmt))} {w}w' for w in widths), sizes)
+        for fmt in IMAGE_FORMATS
+        for widths in [built_widths(name, fmt)] if widths
+    ))
+    return format_html(
+        '<picture style="display: contents">{}<img src="{}"{}></picture>',
+        sources, static(name), format_html_join('', ' {}="{}"', attrs.items())
+    )
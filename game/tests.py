@@ -0,0 +1,47 @@
+from django.test import TestCase
+from game.models import Room, Player, Round, RoundParticipation
+from game.state import save_round_result
+
+
+class SaveRoundResultTests(TestCase):
+    def seed_round(self, player_count):
+        """A room with a round in play and the results _complete_round would hand to save_round_result"""
+        room = Room.objects.create(status='IN_PROGRESS')
+        players = Player.objects.bulk_create([
+            Player(room=room, session_id=f'{room.id}-{i}', name=f'Player {i}', total_score=i)
+            for i in range(player_count)
+        ])
+        round_obj = Round.objects.create(room=room, round_number=1, status='PLAYING',
+                                         police_player=players[0], thief_player=players[1])
+        RoundParticipation.objects.bulk_create([
+            RoundParticipation(round=round_obj, player=player, role_name=f'Role {i}', win_points=100 * (i + 1))
+            for i, player in enumerate(players)
+        ])
+        results = [{
+            'player_id': player.id,
+            'final_score': 0 if i == 1 else 100 * (i + 1),
+            'is_caught': i == 1,
+            'is_wrongly_accused': False,
+        } for i, player in enumerate(players)]
+        return round_obj, results
+
+    def test_query_count_does_not_grow_with_the_room(self):
+        for player_count in (2, 12):
+            with self.subTest(players=player_count):
+                round_obj, results = self.seed_round(player_count)
+                # The round, the participations and the players' totals, in one savepoint
+                with self.assertNumQueries(5):
+                    save_round_result(round_obj.id, 'POLICE', results)
+
+    def test_scores_are_stored(self):
+        round_obj, results = self.seed_round(12)
+        save_round_result(round_obj.id, 'POLICE', results)
+
+        round_obj.refresh_from_db()
+        self.assertEqual((round_obj.status, round_obj.winner), ('COMPLETED', 'POLICE'))
+        participations = {p.player_id: p for p in round_obj.participations.all()}
+        totals = dict(Player.objects.filter(room=round_obj.room).values_list('id', 'total_score'))
+        for i, result in enumerate(results):
+            self.assertEqual(participations[result['player_id']].final_score, result['final_score'])
+            self.assertEqual(participations[result['player_id']].is_caught, result['is_caught'])
+            self.assertEqual(totals[result['player_id']], i + result['final_score'])
@@ -1,88 +1,135 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import HttpResponse
 from django.shortcuts import render, redirect
+from . import metrics as game_metrics
 from .models import Room, Player
 import uuid
-import random
-from django.db import IntegrityError
 
-def index(request):
+NAME_MAX_LENGTH = Player._meta.get_field('name').max_length
+
+
+async def index(request):
     if request.method == "POST":
         action = request.POST.get('action')
-        name = request.POST.get('name')
-        
-        if not request.session.get('session_id'):
-            request.session['session_id'] = str(uuid.uuid4())
-        session_id = request.session['session_id']
+        name = (request.POST.get('name') or '').strip()
+        if action in ('create', 'join') and not name:
+            return render(request, 'index.html', {'error': 'Please enter your name.'})
+
+        session_id = await request.session.aget('session_id')
+        if not session_id:
+            session_id = str(uuid.uuid4())
+            await request.session.aset('session_id', session_id)
 
         if action == 'create':
-            room = Room.objects.create(host_session_id=session_id)
-            # Create player for host
-            Player.objects.create(room=room, name=name, session_id=session_id, is_host=True)
-            return redirect('room', room_code=room.room_code)
-        
+            room_code = await create_room(session_id, name)
+            if not room_code:
+                return render(request, 'index.html', {'error': 'Unable to create a room. Please try again.'})
+            return redirect('room', room_code=room_code)
+
         elif action == 'join':
-            room_code = request.POST.get('room_code').upper()
+            room_code = (request.POST.get('room_code') or '').strip().upper()
+            if not room_code:
+                return render(request, 'index.html', {'error': 'Please enter a room code.'})
             try:
-                room = Room.objects.get(room_code=room_code)
-                
-                # Check if player already exists
-                try:
-                    player = Player.objects.get(room=room, session_id=session_id)
-                    # Player exists, update name if needed
-                    if player.name != name:
-                        try:
-                            player.name = name
-                            player.save()
-                        except IntegrityError:
-                            # Name taken, try suffixes
-                            for _ in range(5):
-                                try:
-                                    suffix = random.randint(1000, 9999)
-                                    player.name = f"{name} #{suffix}"
-                                    player.save()
-                                    break
-                                except IntegrityError:
-                                    continue
-                except Player.DoesNotExist:
-                    # Create new player
-                    target_name = name
-                    player = None
-                    for _ in range(10): # Try 10 times
-                        try:
-                            player = Player.objects.create(
-                                room=room, 
-                                session_id=session_id,
-                                name=target_name
-                            )
-                            break
-                        except IntegrityError:
-                            suffix = random.randint(1000, 9999)
-                            target_name = f"{name} #{suffix}"
-                    
-                    if not player:
-                         return render(request, 'index.html', {'error': 'Unable to join: Name collision. Please try again.'})
-
-                return redirect('room', room_code=room.room_code)
+                joined = await join_room(room_code, session_id, name)
             except Room.DoesNotExist:
                 return render(request, 'index.html', {'error': 'Room not found'})
+            if not joined:
+                return render(request, 'index.html', {'error': 'Unable to join: Name collision. Please try again.'})
+            return redirect('room', room_code=room_code)
 
         # Play Online Removed
 
     return render(request, 'index.html')
 
-def room(request, room_code):
-    try:
-        room = Room.objects.get(room_code=room_code)
-    except Room.DoesNotExist:
-        return redirect('index')
-    
-    session_id = request.session.get('session_id')
-    try:
-        player = Player.objects.get(room=room, session_id=session_id)
-    except Player.DoesNotExist:
+
+async def room(request, room_code):
+    session_id = await request.session.aget('session_id')
+    # One query for the whole page: every player in the room, with the room joined in
+    players = [p async for p in Player.objects.filter(room__room_code=room_code).select_related('room').order_by('id')]
+    player = next((p for p in players if p.session_id == session_id), None)
+    if not player:
         return redirect('index')
 
     return render(request, 'room.html', {
-        'room': room,
+        'room': player.room,
         'player': player,
-        'is_host': player.is_host
+        'players': players,
+        'is_host': player.is_host,
+        # Everything static/js/room.js needs to know about this room and player
+        'room_data': {
+            'roomCode': player.room.room_code,
+            'playerName': player.name,
+            'sessionId': player.session_id,
+            'isHost': player.is_host,
+        },
     })
+
+
+async def metrics(request):
+    """This worker's game metrics in the Prometheus text format"""
+    if settings.METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {settings.METRICS_TOKEN}':
+        return HttpResponse(status=403)
+    return HttpResponse(game_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@sync_to_async
+def create_room(session_id, name):
+    """Create a room with its host in one transaction; returns the room code or None"""
+    for _ in range(3):
+        try:
+            with transaction.atomic():
+                room = Room.objects.create(host_session_id=session_id)
+                Player.objects.create(room=room, name=name, session_id=session_id, is_host=True)
+            return room.room_code
+        except IntegrityError:
+            # Allocated codes are unique, but rooms created before the allocator (or
+            # an admin-typed code) can still hold the one we drew; draw another
+            continue
+    return None
+
+
+@sync_to_async
+def join_room(room_code, session_id, name):
+    """Add the session to the room, or rename its player, under a name nobody else in the room uses.
+
+    Returns False if the name could not be settled (the room kept changing under us).
+    """
+    name = name[:NAME_MAX_LENGTH]
+    room_id = Room.objects.values_list('id', flat=True).get(room_code=room_code)
+    for _ in range(3):
+        # This session's player and every name that could clash with the requested one
+        rows = list(Player.objects.filter(room_id=room_id).filter(
+            Q(session_id=session_id) | Q(name__startswith=name[:NAME_MAX_LENGTH - 6])
+        ).values_list('id', 'session_id', 'name'))
+        mine = next((row for row in rows if row[1] == session_id), None)
+        if mine and mine[2] == name:
+            return True
+        target_name = free_name(name, {row[2] for row in rows if row is not mine})
+        try:
+            with transaction.atomic():
+                if mine:
+                    Player.objects.filter(id=mine[0]).update(name=target_name)
+                else:
+                    Player.objects.create(room_id=room_id, session_id=session_id, name=target_name)
+            return True
+        except IntegrityError:
+            # Someone took the same name between our read and write
+            continue
+    return False
+
+
+def free_name(name, taken):
+    """`name`, or the first of "name #2", "name #3", ... that is not taken, within the column length"""
+    if name not in taken:
+        return name
+    n = 2
+    while True:
+        suffix = f" #{n}"
+        candidate = name[:NAME_MAX_LENGTH - len(suffix)] + suffix
+        if candidate not in taken:
+            return candidate
+        n += 1
@@ -2,15 +2,15 @@ import os
 import django
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kallanum_policum.settings')
 django.setup()
 
 import game.routing
+from game.middleware import SessionOnlyMiddleware
 
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
+    "websocket": SessionOnlyMiddleware(
         URLRouter(
             game.routing.websocket_urlpatterns
         )
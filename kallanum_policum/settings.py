@@ -83,12 +83,123 @@ TEMPLATES = [
 WSGI_APPLICATION = 'kallanum_policum.wsgi.application'
 ASGI_APPLICATION = 'kallanum_policum.asgi.application'
 
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer"
+# Channel layer backend:
+# 'memory' - single process only (default without REDIS_URL)
+# 'redis'  - channels_redis on REDIS_URL, required to run more than one worker
+REDIS_URL = os.environ.get('REDIS_URL')
+# Connections each worker may open to Redis per pool (channel layer, room leases)
+REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS', 1000))
+CHANNEL_LAYER_BACKEND = os.environ.get('CHANNEL_LAYER_BACKEND', 'redis' if REDIS_URL else 'memory')
+
+if CHANNEL_LAYER_BACKEND == 'redis':
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {
+                # redis-py 8 gives up reading after 5s by default, the same time
+                # channels_redis blocks waiting for a message on an idle channel, and
+                # fails commands once 100 connections are busy instead of waiting
+                "hosts": [{
+                    "address": REDIS_URL or 'redis://localhost:6379/0',
+                    "socket_timeout": 15,
+                    "max_connections": REDIS_MAX_CONNECTIONS,
+                }],
+                # Every socket of a worker shares one queue in Redis, and messages
+                # past the capacity (100 by default) are dropped without an error
+                "capacity": int(os.environ.get('CHANNEL_LAYER_CAPACITY', 1000)),
+            },
+        }
     }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer"
+        }
+    }
+
+# Sessions only hold the player's session_id, written once on their first page view.
+# SESSION_STORE picks where they live:
+# 'cached_db'      - read through the cache below, written to both (default)
+# 'signed_cookies' - in the signed cookie itself, no DB or cache at all
+# 'db'             - Django's default, a query on every page load and socket connect
+SESSION_STORE = os.environ.get('SESSION_STORE', 'cached_db')
+SESSION_ENGINE = f'django.contrib.sessions.backends.{SESSION_STORE}'
+
+# Cache: Redis on REDIS_URL when set (shared by every worker), otherwise an
+# in-process LRU per worker holding up to GAME_CACHE_ENTRIES keys
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('GAME_CACHE_ENTRIES', 10000))},
+        }
+    }
+
+# Round timer protocol:
+# 'deadline' - send one round_started with the deadline, clients count down locally
+# 'ticks'    - broadcast a timer_tick to every player each second (legacy clients)
+GAME_TIMER_MODE = os.environ.get('GAME_TIMER_MODE', 'deadline')
+
+# Logging: the game's loggers write key=value lines to stderr from a background thread.
+# GAME_LOG_LEVEL=DEBUG adds one line per action, timer and shuffle retry.
+GAME_LOG_LEVEL = os.environ.get('GAME_LOG_LEVEL', 'INFO')
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'structured': {
+            'class': 'game.logs.StructuredFormatter',
+            'format': '%(asctime)s %(levelname)s %(name)s %(message)s',
+        },
+    },
+    'handlers': {
+        'game': {
+            'class': 'game.logs.BackgroundStreamHandler',
+            'formatter': 'structured',
+        },
+    },
+    'loggers': {
+        'game': {
+            'handlers': ['game'],
+            'level': GAME_LOG_LEVEL,
+            'propagate': False,
+        },
+    },
 }
 
+# /metrics/ (Prometheus text format) requires "Authorization: Bearer <token>" when set
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Threads for the game's DB writes (game.db): round creation, scores, settings.
+# Reads run on Django's shared async ORM thread and no longer queue behind them.
+GAME_DB_WRITE_THREADS = int(os.environ.get('GAME_DB_WRITE_THREADS', 4))
+
+# Room affinity (game.affinity): with REDIS_URL, each room is held by the one worker
+# owning its lease in Redis and sockets reaching another worker are relayed to it,
+# so any number of workers can serve the game. A dead worker's rooms move on after
+# GAME_ROOM_LEASE_SECONDS. Without Redis there must be a single worker.
+GAME_ROOM_ROUTING = bool(REDIS_URL) and CHANNEL_LAYER_BACKEND == 'redis'
+GAME_ROOM_LEASE_SECONDS = int(os.environ.get('GAME_ROOM_LEASE_SECONDS', 30))
+
+# Seconds a disconnected player keeps their seat (and score) before being removed
+GAME_RECONNECT_GRACE = int(os.environ.get('GAME_RECONNECT_GRACE', 30))
+
+# Room sweeper (game.sweeper): rooms with no round started for GAME_ROOM_TTL_HOURS
+# are archived to GAME_ARCHIVE_DIR as gzipped JSONL (empty: no archive) and deleted.
+# GAME_SWEEP_INTERVAL > 0 runs it inside the worker every that many seconds;
+# `python manage.py sweep_rooms` runs it once.
+GAME_ROOM_TTL_HOURS = float(os.environ.get('GAME_ROOM_TTL_HOURS', 24))
+GAME_SWEEP_INTERVAL = int(os.environ.get('GAME_SWEEP_INTERVAL', 0))
+GAME_SWEEP_BATCH_SIZE = int(os.environ.get('GAME_SWEEP_BATCH_SIZE', 200))
+GAME_ARCHIVE_DIR = os.environ.get('GAME_ARCHIVE_DIR', str(BASE_DIR / 'archive'))
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
@@ -100,6 +211,21 @@ DATABASES = {
     )
 }
 
+# PostgreSQL connection pool (psycopg 3): DB_POOL_MAX_SIZE > 0 replaces the
+# persistent connections (one per socket and request, as Django keeps them per
+# async context) with one pool per worker, capping it at DB_POOL_MAX_SIZE.
+# Page requests, socket connects and DB writes each hold a connection only while
+# they run, waiting up to DB_POOL_TIMEOUT seconds for one; connections are
+# checked before they are handed out.
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 0))
+if DB_POOL_MAX_SIZE and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    DATABASES['default'].update(CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=True)
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+        'max_size': DB_POOL_MAX_SIZE,
+        'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -138,7 +264,11 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / "static"]
 STATIC_ROOT = BASE_DIR / "staticfiles"
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# STORAGES replaces STATICFILES_STORAGE, which Django 5.1 no longer reads
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'game.storage.MinifiedStaticFilesStorage'},
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
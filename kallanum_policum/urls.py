@@ -8,6 +8,7 @@ urlpatterns = [
     path('', views.index, name='index'),
     path('test-guide/', TemplateView.as_view(template_name='test_guide.html'), name='test_guide'),
     path('room/<str:room_code>/', views.room, name='room'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
 
 from django.conf import settings
@@ -0,0 +1,674 @@
+// Client runtime for the room page. Per-room values come from the page's
+// #room-data JSON and the images from its <template> elements.
+const { roomCode, playerName, sessionId, isHost } = JSON.parse(document.getElementById('room-data').textContent);
+
+function pictureHtml(id) {
+    return document.getElementById(id).innerHTML;
+}
+
+let myRole = null;
+let myPoints = 0;
+let myDesc = "";
+let isPolice = false;
+let isThief = false;
+let allPlayers = [];
+let chitRevealed = false;
+
+// Lobby roster, kept in sync with player_added/removed/changed deltas
+let roster = new Map(); // session_id -> player
+let rosterVersion = -1;
+let rosterEpoch = null; // which server-side copy of the room rosterVersion counts in
+
+// Countdown is rendered locally from the server's deadline
+let clockOffset = 0; // serverTime - clientTime (ms)
+let roundDeadline = null;
+let countdownInterval = null;
+let currentRoundId = null;
+
+// Compact wire format (game/protocol.py): short keys, numbered actions and players
+// referred to by id. Keep these tables in sync with KEYS and ACTION_CODES there.
+const COMPACT_PROTOCOL = 'kp.compact.v1';
+const LONG_KEYS = {
+    a: 'action', ps: 'players', p: 'player', v: 'version', e: 'epoch', i: 'player_id', n: 'name', av: 'avatar',
+    sid: 'session_id', o: 'online', r: 'role', d: 'description', pt: 'points', ip: 'is_police',
+    it: 'is_thief', ap: 'all_players', w: 'winner', th: 'thief_id', sc: 'scores', s: 'score',
+    ar: 'all_roles', ri: 'round_id', du: 'duration', dl: 'deadline', st: 'server_time',
+    ct: 'client_time', se: 'seconds', ss: 'status', rp: 'rounds_played', mr: 'max_rounds',
+    rd: 'round', nu: 'number', m: 'message'
+};
+const ACTION_NAMES = {
+    1: 'player_snapshot', 2: 'player_added', 3: 'player_changed', 4: 'player_removed',
+    5: 'send_role_to_player', 6: 'round_started', 7: 'round_ended', 8: 'reset_round',
+    9: 'game_over', 10: 'resume', 11: 'clock_sync', 12: 'timer_tick', 13: 'host_change',
+    14: 'error'
+};
+const ROSTER_ACTIONS = ['player_snapshot', 'player_added', 'player_changed', 'player_removed'];
+const PLAYER_FIELDS = ['name', 'avatar', 'session_id'];
+let knownPlayers = new Map(); // player_id -> player; kept after they leave so results can still name them
+let roleDescriptions = new Map(); // role name -> description; the server sends each once per connection
+
+function lengthen(value) {
+    if (Array.isArray(value)) return value.map(lengthen);
+    if (value === null || typeof value !== 'object') return value;
+    const out = {};
+    for (const [key, item] of Object.entries(value)) out[LONG_KEYS[key] || key] = lengthen(item);
+    if ('action' in out) out.action = ACTION_NAMES[out.action] || out.action;
+    if ('player_id' in out && !('name' in out)) {
+        const player = knownPlayers.get(out.player_id) || {name: 'Unknown'};
+        PLAYER_FIELDS.forEach(field => { out[field] = player[field]; });
+    }
+    return out;
+}
+
+// A compact frame in the default format, so the handlers below work on either
+function expandFrame(frame) {
+    const data = lengthen(frame);
+    if (ROSTER_ACTIONS.includes(data.action)) {
+        (data.players || [data.player]).forEach(p => knownPlayers.set(p.player_id, p));
+    }
+    if ('thief_id' in data) {
+        const thief = knownPlayers.get(data.thief_id);
+        data.thief_name = thief ? thief.name : 'Unknown';
+    }
+    if (data.action === 'send_role_to_player') {
+        data.target_session_id = sessionId; // Role frames only ever go to their owner
+        if ('description' in data) roleDescriptions.set(data.role, data.description);
+        else data.description = roleDescriptions.get(data.role);
+    }
+    return data;
+}
+
+// Debug info
+console.log('🎮 Initializing game room');
+console.log('Room Code:', roomCode);
+const protocol = window.location.protocol === 'https:' ? 'wss://' : 'ws://';
+let chatSocket = null;
+
+// Reconnects back off exponentially with full jitter so a server restart is
+// not met by every client at once; a socket that stayed up resets the backoff
+const RECONNECT_BASE_MS = 500;
+const RECONNECT_MAX_MS = 30000;
+const STABLE_SOCKET_MS = 10000;
+// The server closed this socket because the same player opened another one
+const CLOSE_SUPERSEDED = 4001;
+let reconnectAttempts = 0;
+let reconnectTimer = null;
+
+function connectWebSocket() {
+    // One socket per tab: never open a second while one is connecting or open
+    if (chatSocket && chatSocket.readyState <= WebSocket.OPEN) return;
+    clearTimeout(reconnectTimer);
+    reconnectTimer = null;
+    console.log("🔌 Connecting...");
+    
+    if (!roomCode) {
+        alert("CRITICAL ERROR: Room code is missing!");
+        return;
+    }
+
+    const status = document.getElementById('connection-status');
+    if (status) status.innerHTML = '<span style="color: #f1c40f;">⏳ Connecting...</span>';
+
+    // Tell the server which roster we hold so it can skip resending it
+    let url = protocol + window.location.host + '/ws/room/' + roomCode + '/';
+    if (rosterEpoch !== null) url += `?since=${rosterEpoch}.${rosterVersion}`;
+
+    let socket;
+    try {
+        socket = new WebSocket(url, [COMPACT_PROTOCOL]);
+    } catch (e) {
+        alert("WebSocket Creation Error: " + e);
+        return;
+    }
+    chatSocket = socket;
+    let openedAt = null;
+
+    chatSocket.onopen = function(e) {
+        console.log('✅ Connected');
+        openedAt = Date.now();
+        if (status) status.innerHTML = '<span style="color: #2ed573;">✅ Connected</span>';
+        
+        // The server sends the full roster on connect
+        chatSocket.send(JSON.stringify({
+            'action': 'clock_sync',
+            'client_time': Date.now()
+        }));
+    };
+
+    chatSocket.onmessage = function(e) {
+        let data = JSON.parse(e.data);
+        if (socket.protocol === COMPACT_PROTOCOL) data = expandFrame(data);
+        
+        if (data.action === 'player_snapshot') {
+            roster = new Map(data.players.map(p => [p.session_id, p]));
+            rosterVersion = data.version;
+            rosterEpoch = data.epoch;
+            updatePlayerList(Array.from(roster.values()));
+        }
+        else if (data.action === 'player_added' || data.action === 'player_removed' || data.action === 'player_changed') {
+            applyRosterDelta(data);
+        }
+        else if (data.action === 'send_role_to_player') {
+            if (data.target_session_id === sessionId) {
+                myRole = data.role;
+                myPoints = data.points;
+                myDesc = data.description;
+                isPolice = data.is_police;
+                isThief = data.is_thief;
+                if (data.all_players) allPlayers = data.all_players;
+                showChitScreen();
+            }
+        }
+        else if (data.action === 'round_ended') {
+            stopCountdown();
+            showResult(data.winner, data.thief_name, data.scores);
+        }
+        else if (data.action === 'game_over') {
+            stopCountdown();
+            showPodium(data.scores);
+        }
+        else if (data.action === 'clock_sync') {
+            // Assume the reply took as long as the request
+            const now = Date.now();
+            clockOffset = data.server_time - (data.client_time + now) / 2;
+        }
+        else if (data.action === 'round_started') {
+            currentRoundId = data.round_id;
+            startCountdown(data.deadline);
+        }
+        else if (data.action === 'resume') {
+            // Sent on (re)connect once the game has started: pick up where we left off
+            if (data.round) {
+                if (data.round.deadline) startCountdown(data.round.deadline);
+                if (data.role && data.round.round_id !== currentRoundId) {
+                    currentRoundId = data.round.round_id;
+                    myRole = data.role.role;
+                    myPoints = data.role.points;
+                    myDesc = data.role.description;
+                    isPolice = data.role.is_police;
+                    isThief = data.role.is_thief;
+                    if (data.role.all_players) allPlayers = data.role.all_players;
+                    showChitScreen();
+                }
+            }
+            else if (data.status === 'FINISHED') {
+                showPodium(data.scores);
+            }
+        }
+        else if (data.action === 'timer_tick') {
+            updateTimer(data.seconds);
+        }
+        else if (data.action === 'reset_round') {
+            stopCountdown();
+            resetUI();
+        }
+        else if (data.action === 'host_change') {
+            if (data.new_host_session_id === sessionId) {
+                alert("👑 You are now the Host!");
+                location.reload();
+            }
+        }
+        else if (data.action === 'error') {
+            alert("⚠️ Error: " + data.message);
+            // Re-enable start button
+            const btn = document.querySelector('button[onclick="startGame(this)"]');
+            if(btn) {
+                btn.disabled = false;
+                btn.innerHTML = '▶ Start Game';
+                btn.style.opacity = '1';
+                btn.style.cursor = 'pointer';
+            }
+        }
+        else if (data.action === 'settings_data') {
+            populateSettingsModal(data.settings);
+        }
+        else if (data.action === 'settings_saved') {
+            alert("✅ " + data.message);
+            closeSettings();
+        }
+    };
+
+    chatSocket.onclose = function(e) {
+        if (socket !== chatSocket) return;
+        if (e.code === CLOSE_SUPERSEDED) {
+            console.log('❌ Opened in another tab');
+            if (status) status.innerHTML = '<span style="color: #ff4757;">❌ Opened in another tab</span>';
+            return;
+        }
+        if (openedAt !== null && Date.now() - openedAt >= STABLE_SOCKET_MS) reconnectAttempts = 0;
+        const delay = Math.random() * Math.min(RECONNECT_MAX_MS, RECONNECT_BASE_MS * 2 ** reconnectAttempts);
+        reconnectAttempts++;
+        console.log(`❌ Disconnected. Retrying in ${(delay / 1000).toFixed(1)}s...`);
+        if (status) status.innerHTML = '<span style="color: #ff4757;">❌ Disconnected</span>';
+        reconnectTimer = setTimeout(connectWebSocket, delay);
+    };
+    
+    chatSocket.onerror = function(err) {
+        console.error('Socket Error:', err);
+        socket.close();
+    };
+}
+
+// Reconnect straight away when the tab comes back online instead of waiting out the backoff
+window.addEventListener('online', function() {
+    if (reconnectTimer) connectWebSocket();
+});
+
+function resetUI() {
+    myRole = null;
+    myPoints = 0;
+    myDesc = "";
+    isPolice = false;
+    isThief = false;
+    chitRevealed = false;
+    
+    // Reset Card
+    const card = document.getElementById('chit-card');
+    if(card) card.style.transform = 'rotateY(0deg)';
+    
+    // Hide all screens except Lobby
+    document.getElementById('chit-screen').style.display = 'none';
+    document.getElementById('police-screen').style.display = 'none';
+    document.getElementById('player-screen').style.display = 'none';
+    document.getElementById('result-screen').style.display = 'none';
+    document.getElementById('podium-screen').style.display = 'none';
+    
+    // Show Lobby
+    document.getElementById('lobby-screen').style.display = 'block';
+    
+    // Update status text
+    const statusDiv = document.querySelector('#lobby-screen .glass-card');
+    if(statusDiv) statusDiv.innerHTML = '<div style="font-size: 2rem; margin-bottom: 10px; animation: pulseGlow 2s infinite;">⏳</div> Starting next round...';
+}
+
+
+
+function startGame(btn) {
+    console.log('🎮 Host starting game...');
+    if(btn) {
+        btn.disabled = true;
+        btn.innerHTML = '⏳ Starting...';
+        btn.style.opacity = '0.7';
+        btn.style.cursor = 'not-allowed';
+    }
+    
+    chatSocket.send(JSON.stringify({
+        'action': 'start_game',
+        'message': 'Host started the game'
+    }));
+}
+
+function openSettings() {
+    document.getElementById('settings-modal').style.display = 'block';
+    document.getElementById('roles-settings-container').innerHTML = '<p style="color: #888;">Loading roles...</p>';
+    
+    // Request current settings
+    chatSocket.send(JSON.stringify({
+        'action': 'get_settings'
+    }));
+}
+
+function closeSettings() {
+    document.getElementById('settings-modal').style.display = 'none';
+}
+
+function populateSettingsModal(settings) {
+    document.getElementById('setting-max-rounds').value = settings.max_rounds;
+    document.getElementById('setting-timer-duration').value = settings.timer_duration || 60;
+    document.getElementById('timer-value-display').textContent = (settings.timer_duration || 60) + 's';
+    
+    const container = document.getElementById('roles-settings-container');
+    container.innerHTML = '';
+    
+    settings.roles.forEach(role => {
+        container.innerHTML += `
+            <div class="role-setting-item" data-id="${role.id}" style="background: rgba(0,0,0,0.3); padding: 15px; margin-bottom: 10px; border-radius: 12px; display: flex; gap: 15px; align-items: center; border: 1px solid var(--glass-border);">
+                <input type="text" class="role-name-input" value="${role.name}" style="flex: 1;">
+                <input type="number" class="role-points-input" value="${role.win_points}" style="width: 80px;">
+                <span style="font-size: 0.9rem; color: var(--text-muted);">pts</span>
+            </div>
+        `;
+    });
+}
+
+function saveSettings() {
+    const maxRounds = document.getElementById('setting-max-rounds').value;
+    const timerDuration = document.getElementById('setting-timer-duration').value;
+    const roleItems = document.querySelectorAll('.role-setting-item');
+    const rolesData = [];
+    
+    roleItems.forEach(item => {
+        rolesData.push({
+            'id': item.getAttribute('data-id'),
+            'name': item.querySelector('.role-name-input').value,
+            'win_points': item.querySelector('.role-points-input').value
+        });
+    });
+    
+    chatSocket.send(JSON.stringify({
+        'action': 'update_settings',
+        'max_rounds': maxRounds,
+        'timer_duration': timerDuration,
+        'roles': rolesData
+    }));
+}
+
+function applyRosterDelta(delta) {
+    if (delta.version <= rosterVersion) return; // Already in our snapshot
+    if (delta.version !== rosterVersion + 1) {
+        // Missed an update: ask for a fresh snapshot
+        chatSocket.send(JSON.stringify({'action': 'join'}));
+        return;
+    }
+    
+    if (delta.action === 'player_removed') roster.delete(delta.player.session_id);
+    else roster.set(delta.player.session_id, delta.player);
+    rosterVersion = delta.version;
+    updatePlayerList(Array.from(roster.values()));
+}
+
+function updatePlayerList(players) {
+    const list = document.getElementById('player-list');
+    list.innerHTML = '';
+    players.forEach(p => {
+        list.innerHTML += `
+            <div class="player-card fade-in-up" style="${p.online === false ? 'opacity: 0.4;' : ''}">
+                ${pictureHtml('avatar-picture')}
+                <div style="font-weight: bold; font-size: 1.1rem;">${p.name}</div>
+                ${p.online === false ? '<div style="font-size: 0.8rem; color: var(--text-muted);">reconnecting...</div>' : ''}
+            </div>
+        `;
+    });
+}
+
+function showChitScreen() {
+    document.getElementById('lobby-screen').style.display = 'none';
+    document.getElementById('chit-screen').style.display = 'block';
+    
+    // Set role info on the back of the card
+    let icon = 'civilian-icon-picture';
+    if (isPolice) icon = 'police-icon-picture';
+    else if (isThief) icon = 'thief-icon-picture';
+    
+    document.getElementById('role-icon-container').innerHTML = pictureHtml(icon);
+    document.getElementById('role-name').textContent = myRole;
+    document.getElementById('role-points').textContent = myPoints + ' Points';
+    
+    // Reset card flip
+    const card = document.getElementById('chit-card');
+    card.style.transform = 'rotateY(0deg)';
+    chitRevealed = false;
+    document.getElementById('ready-btn').style.display = 'none';
+}
+
+function revealRole() {
+    if (chitRevealed) return;
+    
+    const card = document.getElementById('chit-card');
+    card.style.transform = 'rotateY(180deg)';
+    chitRevealed = true;
+    
+    setTimeout(() => {
+        document.getElementById('ready-btn').style.display = 'block';
+    }, 600);
+}
+
+function readyToPlay() {
+    document.getElementById('chit-screen').style.display = 'none';
+    
+    if (isPolice) {
+        showPoliceScreen();
+    } else {
+        showPlayerScreen();
+    }
+}
+
+function showPoliceScreen() {
+    document.getElementById('police-screen').style.display = 'block';
+    
+    const suspectsList = document.getElementById('suspects-list');
+    suspectsList.innerHTML = '';
+    
+    allPlayers.forEach(p => {
+        if (p.name !== playerName) {
+            suspectsList.innerHTML += `
+                <div class="glass-card fade-in-up" style="margin-bottom: 15px; display: flex; justify-content: space-between; align-items: center; padding: 20px;">
+                    <div style="display: flex; align-items: center; gap: 15px;">
+                        <span style="font-size: 2rem;">👤</span>
+                        <span style="font-size: 1.3rem; font-weight: bold;">${p.name}</span>
+                    </div>
+                    <button class="btn btn-danger" onclick="arrestPlayer('${p.name}')" style="width: auto; padding: 10px 25px; margin: 0; font-size: 0.9rem;">
+                        🚨 ARREST
+                    </button>
+                </div>
+            `;
+        }
+    });
+}
+
+function showPlayerScreen() {
+    document.getElementById('player-screen').style.display = 'block';
+    document.getElementById('current-role').textContent = myRole;
+    document.getElementById('current-points').textContent = myPoints;
+    document.getElementById('role-desc').textContent = myDesc;
+    
+    const otherPlayersList = document.getElementById('other-players-list');
+    otherPlayersList.innerHTML = '';
+    
+    allPlayers.forEach(p => {
+        if (p.name !== playerName) {
+            otherPlayersList.innerHTML += `
+                <div class="player-card fade-in-up">
+                    <div style="font-size: 2.5rem; margin-bottom: 10px;">👤</div>
+                    <div style="font-size: 1rem;">${p.name}</div>
+                </div>
+            `;
+        }
+    });
+}
+
+function arrestPlayer(name) {
+    console.log('🚨 Button Clicked! Attempting to arrest:', name);
+    console.log('Session ID:', sessionId);
+    
+    if (confirm(`Are you sure you want to arrest ${name}?`)) {
+        const arrestMessage = {
+            'action': 'arrest',
+            'arrested_player': name
+        };
+        console.log('📤 Sending arrest message:', arrestMessage);
+        chatSocket.send(JSON.stringify(arrestMessage));
+    }
+}
+
+function updateTimer(seconds) {
+    const display = document.getElementById('timer-display');
+    const pDisplay = document.getElementById('player-timer-display');
+    if (display) display.textContent = seconds + 's';
+    if (pDisplay) pDisplay.textContent = seconds + 's';
+    
+    if (seconds <= 10) {
+        if (display) display.style.color = '#ff4757';
+        if (display) display.style.textShadow = '0 0 10px #ff4757';
+        if (pDisplay) pDisplay.style.color = '#ff4757';
+        if (pDisplay) pDisplay.style.textShadow = '0 0 10px #ff4757';
+    }
+}
+
+function startCountdown(deadline) {
+    roundDeadline = deadline;
+    if (countdownInterval) clearInterval(countdownInterval);
+    
+    const render = () => {
+        const remaining = Math.max(0, Math.ceil((roundDeadline - (Date.now() + clockOffset)) / 1000));
+        updateTimer(remaining);
+        if (remaining === 0) stopCountdown();
+    };
+    render();
+    countdownInterval = setInterval(render, 250);
+}
+
+function stopCountdown() {
+    if (countdownInterval) clearInterval(countdownInterval);
+    countdownInterval = null;
+    roundDeadline = null;
+}
+
+function showResult(winner, thiefName, scores) {
+    document.getElementById('police-screen').style.display = 'none';
+    document.getElementById('player-screen').style.display = 'none';
+    document.getElementById('result-screen').style.display = 'block';
+    
+    const icon = document.getElementById('result-icon');
+    const title = document.getElementById('result-title');
+    const message = document.getElementById('result-message');
+    
+    if (winner === 'POLICE') {
+        icon.textContent = '👮';
+        title.textContent = 'Police Wins!';
+        title.style.color = 'var(--primary-color)';
+        message.innerHTML = `The thief <span style="color: var(--secondary-color); font-weight: bold; font-size: 1.5rem;">${thiefName}</span> was caught!`;
+    } else {
+        icon.textContent = '🎭';
+        title.textContent = 'Thief Escapes!';
+        title.style.color = 'var(--secondary-color)';
+        message.innerHTML = `<span style="color: var(--secondary-color); font-weight: bold; font-size: 1.5rem;">${thiefName}</span> was the thief and got away!`;
+    }
+    
+    const leaderboardBody = document.getElementById('leaderboard-body');
+    leaderboardBody.innerHTML = '';
+    scores.forEach((s, i) => {
+        const medal = i === 0 ? '🥇' : i === 1 ? '🥈' : i === 2 ? '🥉' : '';
+        leaderboardBody.innerHTML += `
+            <tr style="border-bottom: 1px solid var(--glass-border);">
+                <td style="padding: 15px;">${medal} ${i+1}</td>
+                <td style="padding: 15px;">${s.name}</td>
+                <td style="padding: 15px; text-align: right; color: var(--primary-color); font-weight: bold;">${s.score}</td>
+            </tr>
+        `;
+    });
+    
+    // Generate AI Insights
+    generateAIInsights(scores, winner, thiefName);
+}
+
+function generateAIInsights(scores, winner, thiefName) {
+    const insightsDiv = document.getElementById('ai-insights');
+    if (!insightsDiv) return;
+    
+    let insights = '';
+    
+    // MVP Analysis
+    const mvp = scores[0];
+    const mvpEmoji = mvp.score > 150 ? '🌟' : '⭐';
+    insights += `<div style="padding: 12px; margin-bottom: 10px; background: rgba(255,215,0,0.1); border-left: 3px solid #FFD700; border-radius: 5px;">
+        ${mvpEmoji} <strong>MVP:</strong> ${mvp.name} with ${mvp.score} points!
+    </div>`;
+    
+    // Performance Analysis
+    if (scores.length >= 2) {
+        const gap = scores[0].score - scores[1].score;
+        if (gap > 50) {
+            insights += `<div style="padding: 12px; margin-bottom: 10px; background: rgba(46,213,115,0.1); border-left: 3px solid #2ed573; border-radius: 5px;">
+                🚀 <strong>Dominant Performance:</strong> ${mvp.name} is leading by ${gap} points!
+            </div>`;
+        } else if (gap < 20) {
+            insights += `<div style="padding: 12px; margin-bottom: 10px; background: rgba(255,107,107,0.1); border-left: 3px solid #ff6b6b; border-radius: 5px;">
+                🔥 <strong>Close Race:</strong> Top 2 players are separated by only ${gap} points!
+            </div>`;
+        }
+    }
+    
+    // Winner Analysis
+    if (winner === 'POLICE') {
+        insights += `<div style="padding: 12px; margin-bottom: 10px; background: rgba(52,152,219,0.1); border-left: 3px solid #3498db; border-radius: 5px;">
+            👮 <strong>Justice Served:</strong> The police successfully caught ${thiefName}. Great detective work!
+        </div>`;
+    } else {
+        insights += `<div style="padding: 12px; margin-bottom: 10px; background: rgba(155,89,182,0.1); border-left: 3px solid #9b59b6; border-radius: 5px;">
+            🎭 <strong>Master Escape:</strong> ${thiefName} evaded capture! The thief wins this round.
+        </div>`;
+    }
+    
+    // Trend Analysis
+    const lastPlayer = scores[scores.length - 1];
+    if (lastPlayer.score < 50) {
+        insights += `<div style="padding: 12px; margin-bottom: 10px; background: rgba(255,159,64,0.1); border-left: 3px solid #ff9f40; border-radius: 5px;">
+            💡 <strong>Tip for ${lastPlayer.name}:</strong> Try to be more strategic in the next round!
+        </div>`;
+    }
+    
+    // Random Motivational Insight
+    const motivations = [
+        "🎯 <strong>Next Round Prediction:</strong> The competition is heating up!",
+        "🧠 <strong>Strategy Tip:</strong> Watch player behavior patterns for clues.",
+        "⚡ <strong>Fun Fact:</strong> Quick decisions often lead to better outcomes!",
+        "🎲 <strong>Remember:</strong> Every player has a chance to win!"
+    ];
+    const randomMotivation = motivations[Math.floor(Math.random() * motivations.length)];
+    insights += `<div style="padding: 12px; background: rgba(108,92,231,0.1); border-left: 3px solid #6c5ce7; border-radius: 5px;">
+        ${randomMotivation}
+    </div>`;
+    
+    insightsDiv.innerHTML = insights;
+}
+
+function nextRound() {
+    // Send request to server to reset everyone
+    chatSocket.send(JSON.stringify({
+        'action': 'next_round',
+        'after_round': currentRoundId
+    }));
+}
+
+function showPodium(scores) {
+    // Hide all other screens
+    document.getElementById('lobby-screen').style.display = 'none';
+    document.getElementById('chit-screen').style.display = 'none';
+    document.getElementById('police-screen').style.display = 'none';
+    document.getElementById('player-screen').style.display = 'none';
+    document.getElementById('result-screen').style.display = 'none';
+    document.getElementById('podium-screen').style.display = 'block';
+    
+    // Gold
+    if (scores[0]) {
+        const goldName = document.getElementById('gold-name');
+        const goldScore = document.getElementById('gold-score');
+        if (goldName) goldName.textContent = scores[0].name;
+        if (goldScore) goldScore.textContent = scores[0].score;
+    }
+    
+    // Silver
+    if (scores[1]) {
+        const silverName = document.getElementById('silver-name');
+        const silverScore = document.getElementById('silver-score');
+        if (silverName) silverName.textContent = scores[1].name;
+        if (silverScore) silverScore.textContent = scores[1].score;
+    }
+    
+    // Bronze
+    if (scores[2]) {
+        const bronzeName = document.getElementById('bronze-name');
+        const bronzeScore = document.getElementById('bronze-score');
+        if (bronzeName) bronzeName.textContent = scores[2].name;
+        if (bronzeScore) bronzeScore.textContent = scores[2].score;
+    }
+    
+    // List
+    const list = document.getElementById('final-leaderboard');
+    list.innerHTML = '';
+    scores.forEach((s, i) => {
+        if (i > 2) {
+            list.innerHTML += `
+                <div style="display: flex; justify-content: space-between; padding: 15px; border-bottom: 1px solid var(--glass-border);">
+                    <span>#${i+1} ${s.name}</span>
+                    <span style="color: var(--primary-color); font-weight: bold;">${s.score}</span>
+                </div>
+            `;
+        }
+    });
+}
+
+
+// Initialize WebSocket connection
+connectWebSocket();